@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/ws 延迟基准：另一个客户端读取大模型文件时，model.list 的延迟是否受影响
+
+先单独测 model.list 的延迟（基线），再在另一个连接上循环 model.get 一个
+大文件（默认 100 MB）的同时测 model.list，输出两组的 p50/p99/max。
+服务端的文件读写和序列化在线程池中执行；剩下的停顿主要来自 websockets 库在
+事件循环中编码、压缩（permessage-deflate）和发送整条大消息，--no-deflate 时
+客户端不协商压缩，可以比较压缩带来的那部分停顿。
+
+需要先启动服务（uvicorn main:app），并安装 websockets（uvicorn[standard] 自带）。
+
+用法:
+    python bench_ws.py [--url ws://127.0.0.1:8000/ws] [--resource 目录]
+                       [--size-mb 100] [--seconds 10] [--no-deflate]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import websockets
+
+
+ROOT = Path(__file__).resolve().parent.parent
+BIG_NAME = "bench_large_model.bin"
+
+_ids = itertools.count(1)
+
+
+def _make_big_file(path: Path, size_mb: int) -> None:
+    row = "    " + " ".join(["1.234567"] * 200) + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Bench\nm:\n")
+        written = 0
+        while written < size_mb << 20:
+            f.write(row * 64)
+            written += len(row) * 64
+
+
+async def _call(ws, name: str, params: Dict[str, object]) -> Dict[str, object]:
+    cmd_id = next(_ids)
+    await ws.send(json.dumps({"topic": "LOADER", "cmd_id": cmd_id, "name": name, "data": json.dumps(params)}))
+    while True:
+        reply = json.loads(await ws.recv())
+        if reply.get("cmd_id") == cmd_id:
+            return reply
+
+
+def _connect(url: str, deflate: bool):
+    return websockets.connect(url, max_size=None, compression="deflate" if deflate else None)
+
+
+async def _measure_list(url: str, seconds: float, deflate: bool) -> List[float]:
+    latencies: List[float] = []
+    async with _connect(url, deflate) as ws:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            await _call(ws, "model.list", {})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(0.01)
+    return latencies
+
+
+async def _read_big(url: str, deflate: bool, stop, count) -> None:
+    async with _connect(url, deflate) as ws:
+        while not stop.is_set():
+            # 每次只有一个请求在途，收到的就是它的回复；不解码 JSON，少占客户端 CPU
+            await ws.send(json.dumps({"topic": "LOADER", "cmd_id": next(_ids), "name": "model.get",
+                                      "data": json.dumps({"filename": BIG_NAME})}))
+            await ws.recv()
+            count.value += 1
+
+
+def _read_big_process(url: str, deflate: bool, stop, count) -> None:
+    # 在单独的进程中读大文件：客户端解码 100 MB 回复时会卡住自己的事件循环，
+    # 与测量 model.list 的连接放在同一进程里会把客户端的停顿也算进延迟
+    asyncio.run(_read_big(url, deflate, stop, count))
+
+
+def _report(title: str, latencies: List[float]) -> None:
+    data = sorted(latencies)
+    if not data:
+        print(f"{title}: 没有样本")
+        return
+    p50 = data[len(data) // 2]
+    p99 = data[min(len(data) - 1, int(len(data) * 0.99))]
+    print(f"{title}: n={len(data)} p50={p50:.2f}ms p99={p99:.2f}ms max={data[-1]:.2f}ms")
+
+
+async def run(url: str, resource: Path, size_mb: int, seconds: float, deflate: bool = True) -> None:
+    big = resource / BIG_NAME
+    resource.mkdir(parents=True, exist_ok=True)
+    print(f"生成 {big}（{size_mb} MB）...")
+    _make_big_file(big, size_mb)
+    try:
+        _report("model.list 基线", await _measure_list(url, seconds, deflate))
+
+        stop = multiprocessing.Event()
+        count = multiprocessing.Value("i", 0)
+        reader = multiprocessing.Process(target=_read_big_process, args=(url, deflate, stop, count))
+        reader.start()
+        await asyncio.sleep(0.5)
+        latencies = await _measure_list(url, seconds, deflate)
+        stop.set()
+        await asyncio.get_running_loop().run_in_executor(None, reader.join)
+        reads = count.value
+        _report(f"model.list 并发读大文件（完成 {reads} 次 model.get）", latencies)
+    finally:
+        big.unlink()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    options: Dict[str, str] = {}
+    deflate = True
+    while args:
+        flag = args.pop(0)
+        if flag == "--no-deflate":
+            deflate = False
+            continue
+        if flag not in ("--url", "--resource", "--size-mb", "--seconds") or not args:
+            print(__doc__.strip())
+            return 1
+        options[flag] = args.pop(0)
+
+    url = options.get("--url", "ws://127.0.0.1:8000/ws")
+    resource = Path(options.get("--resource", os.environ.get("RESOURCE_DIR", str(ROOT / "resource"))))
+    asyncio.run(run(url, resource, int(options.get("--size-mb", "100")), float(options.get("--seconds", "10")), deflate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
 import json
+import math
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 
-from python_bridge.bin_parser_text import parse_text_bin, build_text_bin
+from python_bridge.bin_parser_text import (
+    TextParseCache, parse_text_bin, reparse_text_bin, build_text_bin, diff_text_bin, json_default, to_columnar
+)
+from python_bridge.model_validator import get_default_validator
 
 
 ROOT = Path(__file__).resolve().parent.parent
@@ -23,6 +37,15 @@ REG_DEF_PATH = DATA_DIR / "register_definitions.json"
 # 对方可以通过环境变量 RESOURCE_DIR 指向“他的 Python 工程/resource 目录”
 RESOURCE_DIR = Path(os.environ.get("RESOURCE_DIR", str(ROOT / "resource"))).resolve()
 
+# 同时进行的文件读写数量上限（环境变量 IO_CONCURRENCY，默认 4）
+IO_CONCURRENCY = max(1, int(os.environ.get("IO_CONCURRENCY", "4")))
+# 大文本按块读取/转义的块大小（字符数）
+TEXT_CHUNK = 1 << 20
+# 每个 WebSocket 连接同时处理的请求数上限（环境变量 WS_CONCURRENCY，默认 8）
+WS_CONCURRENCY = max(1, int(os.environ.get("WS_CONCURRENCY", "8")))
+# 文本 bin 解析结果缓存（按内容 sha256），model.getParsed / bin.parse 共用
+PARSE_CACHE = TextParseCache(maxsize=max(1, int(os.environ.get("PARSE_CACHE_SIZE", "32"))))
+
 app = FastAPI()
 
 # 1) 托管打包产物 cs/（访问 / 即打开 cs/index.html）
@@ -65,49 +88,352 @@ def _list_bin_files(dir_path: Path) -> List[Dict[str, Any]]:
         )
     return out
 
-def _read_text_file(path: Path) -> str:
+def _read_text_chunks(path: Path) -> List[str]:
     # 文本 bin：按 utf-8 读取；若有乱码，替换字符保证不抛异常
-    return path.read_text(encoding="utf-8", errors="replace")
+    # 按 TEXT_CHUNK 分块读取、按块返回，交给 _dumps_json 时省去一次整体拼接
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return list(iter(lambda: f.read(TEXT_CHUNK), ""))
+
+def _read_model_file(path: Path) -> Optional[List[str]]:
+    # 文件不存在返回 None
+    if not path.exists():
+        return None
+    return _read_text_chunks(path)
 
 def _write_text_file(path: Path, content: str) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(content, encoding="utf-8")
 
+def _save_as(path: Path, content: str) -> bool:
+    # 目标已存在返回 False
+    if path.exists():
+        return False
+    _write_text_file(path, content)
+    return True
+
+def _delete_file(path: Path) -> bool:
+    # 文件不存在返回 False
+    if not path.exists():
+        return False
+    path.unlink()
+    return True
+
+_io_limit: Optional[asyncio.Semaphore] = None
+
+async def _run_io(func, *args):
+    """
+    在线程池中执行阻塞的文件操作，同时进行的数量不超过 IO_CONCURRENCY
+
+    resource 目录的读写、glob、stat 都经由这里，避免一次慢速读盘卡住所有连接
+    """
+    global _io_limit
+    if _io_limit is None:
+        _io_limit = asyncio.Semaphore(IO_CONCURRENCY)
+    async with _io_limit:
+        return await run_in_threadpool(func, *args)
+
+# 占位值：_dumps_json 在这里填入大段文本
+_TEXT_SLOT = "\x00text\x00"
+_TEXT_SLOT_JSON = json.dumps(_TEXT_SLOT)
+
+# _json_pieces 中一次交给 json.dumps 的列表元素个数（小容器，如矩阵行、参数字典，算一个元素）
+JSON_BATCH = 64
+# 小容器的上限：扁平列表的元素数、字典的键数
+JSON_FLAT_MAX = 4096
+JSON_SMALL_KEYS = 64
+# array 也算容器：不整体交给 json.dumps（那样要经 json_default 转成 list），由 _json_array 直接写出
+_JSON_CONTAINERS = frozenset((dict, list, tuple, array))
+_JSON_NUMERIC_TYPECODES = frozenset("bBhHiIlLqQfd")
+
+def _json_flat(v: Any) -> bool:
+    # 不含容器的短列表（如矩阵行）
+    return type(v) in (list, tuple) and len(v) <= JSON_FLAT_MAX and _JSON_CONTAINERS.isdisjoint(map(type, v))
+
+def _json_small(v: Any) -> bool:
+    """
+    可以整体交给一次 json.dumps 的值：标量、短字符串、扁平短列表，以及值都是这些的小字典
+
+    字符串等按对象大小（sys.getsizeof）累计，不超过 TEXT_CHUNK
+    """
+    t = type(v)
+    if t is dict:
+        if len(v) > JSON_SMALL_KEYS:
+            return False
+        values = v.values()
+        if _JSON_CONTAINERS.isdisjoint(map(type, values)):
+            # 全是标量（参数字典的常见情况），整批在 C 层检查
+            return sum(map(sys.getsizeof, values)) <= TEXT_CHUNK
+        size = 0
+        for x in values:
+            if type(x) in _JSON_CONTAINERS:
+                if not _json_flat(x):
+                    return False
+            else:
+                size += sys.getsizeof(x)
+        return size <= TEXT_CHUNK
+    if t in _JSON_CONTAINERS:
+        return _json_flat(v)
+    return sys.getsizeof(v) <= TEXT_CHUNK
+
+def _json_small_batch(batch: Any) -> bool:
+    """
+    一批列表元素能否整体交给一次 json.dumps：全是标量、全是扁平短列表，或全是值为标量的小字典
+
+    只用 C 层的 map/set 检查，不逐个元素调用 Python 函数（参数字典列表可能有几十万项）
+    """
+    types = set(map(type, batch))
+    if types == {dict}:
+        if max(map(len, batch)) > JSON_SMALL_KEYS:
+            return False
+        values = list(chain.from_iterable(map(dict.values, batch)))
+        return _JSON_CONTAINERS.isdisjoint(map(type, values)) and sum(map(sys.getsizeof, values)) <= TEXT_CHUNK
+    if _JSON_CONTAINERS.isdisjoint(types):
+        return sum(map(sys.getsizeof, batch)) <= TEXT_CHUNK
+    return types <= {list, tuple} and all(map(_json_flat, batch))
+
+def _json_array(arr: array, out: List[str]) -> None:
+    """
+    把数值 array 直接写成 JSON 数组，不先转成 list
+
+    整数和有限浮点数的 repr 与 json.dumps 的输出相同；含 NaN/Infinity
+    （求和结果不是有限数）或不是数值类型码时，退回 json_default
+    """
+    if arr.typecode not in _JSON_NUMERIC_TYPECODES or (arr.typecode in "fd" and not math.isfinite(sum(arr))):
+        out.append(json.dumps(arr, default=json_default))
+        return
+    out.append("[")
+    for i in range(0, len(arr), JSON_FLAT_MAX):
+        out.append((", " if i else "") + ", ".join(map(repr, arr[i:i + JSON_FLAT_MAX])))
+    out.append("]")
+
+def _json_pieces(obj: Any, out: List[str]) -> None:
+    """
+    把 obj 序列化为若干 JSON 片段追加到 out，拼接后与 json.dumps 的结果相同
+
+    小容器整体序列化；大字典逐项展开，长列表按 JSON_BATCH 个元素一批，
+    长字符串按 TEXT_CHUNK 分块，typed 解析结果中的 array 由 _json_array 直接写出。每次 C 层 json.dumps 调用都很短，
+    在线程池中执行时事件循环能及时拿到 GIL
+    """
+    if _json_small(obj):
+        out.append(json.dumps(obj, ensure_ascii=False, default=json_default))
+    elif isinstance(obj, dict):
+        if not all(type(k) is str for k in obj):
+            out.append(json.dumps(obj, ensure_ascii=False, default=json_default))
+            return
+        out.append("{")
+        for i, (k, v) in enumerate(obj.items()):
+            out.append((", " if i else "") + json.dumps(k, ensure_ascii=False) + ": ")
+            _json_pieces(v, out)
+        out.append("}")
+    elif isinstance(obj, (list, tuple)):
+        out.append("[")
+        first = True
+        for start in range(0, len(obj), JSON_BATCH):
+            chunk = obj[start:start + JSON_BATCH]
+            if _json_small_batch(chunk):
+                out.append(("" if first else ", ") + json.dumps(chunk, ensure_ascii=False, default=json_default)[1:-1])
+                first = False
+                continue
+            # 混有大元素：小元素攒成一批，大元素递归展开
+            batch: List[Any] = []
+            for v in chunk:
+                if _json_small(v):
+                    batch.append(v)
+                    continue
+                if batch:
+                    out.append(("" if first else ", ") + json.dumps(batch, ensure_ascii=False, default=json_default)[1:-1])
+                    batch = []
+                    first = False
+                if not first:
+                    out.append(", ")
+                _json_pieces(v, out)
+                first = False
+            if batch:
+                out.append(("" if first else ", ") + json.dumps(batch, ensure_ascii=False, default=json_default)[1:-1])
+                first = False
+        out.append("]")
+    elif isinstance(obj, array):
+        _json_array(obj, out)
+    elif type(obj) is str:
+        out.append('"')
+        for i in range(0, len(obj), TEXT_CHUNK):
+            out.append(json.dumps(obj[i:i + TEXT_CHUNK], ensure_ascii=False)[1:-1])
+        out.append('"')
+    else:
+        out.append(json.dumps(obj, ensure_ascii=False, default=json_default))
+
+def _dumps_json(obj: Any, text: Optional[List[str]] = None, raw: Optional[str] = None) -> str:
+    """
+    序列化 JSON；obj 中值为 _TEXT_SLOT 的位置替换为按块给出的文本 text，
+    或已经序列化好的 JSON 片段 raw
+
+    结果与整体 json.dumps 相同，分块方式见 _json_pieces
+    """
+    if text is None and raw is None:
+        parts: List[str] = []
+        _json_pieces(obj, parts)
+        return "".join(parts)
+    out = json.dumps(obj, ensure_ascii=False, default=json_default)
+    before, after = out.split(_TEXT_SLOT_JSON, 1)
+    if raw is not None:
+        return before + raw + after
+    parts = [before, '"']
+    for chunk in text:
+        parts.append(json.dumps(chunk, ensure_ascii=False)[1:-1])
+    parts.append('"')
+    parts.append(after)
+    return "".join(parts)
+
+class _CachedJson(NamedTuple):
+    stamp: tuple     # (mtime_ns, size)
+    body: bytes      # HTTP 响应体
+    etag: str
+    ws_json: str     # WS 回复中 data 字段的 JSON
+
+
+class _JsonFileCache:
+    """
+    data/ 下 JSON 文件的进程级缓存
+
+    只在文件 mtime 或大小变化时重新读取；读取时预先序列化好 HTTP 响应体
+    （附带 ETag）和 WS 回复的 data 部分，之后每次请求只需一次 stat。
+    """
+
+    def __init__(self, path: Path, ws_data: Callable[[Any], Dict[str, Any]]):
+        self.path = path
+        self.ws_data = ws_data
+        self.lock = threading.Lock()
+        self.entry: Optional[_CachedJson] = None
+
+    def get(self) -> _CachedJson:
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            if self.entry is None or self.entry.stamp != stamp:
+                data = _read_json(self.path)
+                body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+                self.entry = _CachedJson(stamp, body, etag, json.dumps(self.ws_data(data), ensure_ascii=False))
+            return self.entry
+
+    async def response(self, request: Request) -> Response:
+        # If-None-Match 命中时返回 304
+        entry = await _run_io(self.get)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        inm = request.headers.get("if-none-match")
+        if inm is not None:
+            tags = [t.strip() for t in inm.split(",")]
+            if "*" in tags or entry.etag in (t[2:] if t.startswith("W/") else t for t in tags):
+                return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def _register_ws_data(data: Any) -> Dict[str, Any]:
+    # 允许文件是 {definitions: []} 或 []
+    defs = data if isinstance(data, list) else data.get("definitions", [])
+    return {"success": True, "definitions": defs}
+
+
+MODEL_DICT_CACHE = _JsonFileCache(MODEL_DICT_PATH, lambda data: {"success": True, **data})
+REG_DEF_CACHE = _JsonFileCache(REG_DEF_PATH, _register_ws_data)
+
+
+def _shape_parse_result(result: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    按请求协商解析结果的返回格式：
+    - 默认（format 缺省或 "full"）：原样返回，兼容现有前端
+    - format="columnar"：列式结构，可选 raw（默认不带）、lineNum（默认带）、
+      packMatrices（默认 true，数值矩阵打包为 base64）
+    """
+    if options.get("format") != "columnar":
+        return result
+    return to_columnar(
+        result,
+        raw=bool(options.get("raw", False)),
+        line_nums=bool(options.get("lineNum", True)),
+        pack_matrices=bool(options.get("packMatrices", True)),
+    )
+
+
+def _check_parse_result(result: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    # 按模型字典做范围校验（结果追加到 warnings，不修改 result），再按请求协商返回格式
+    return _shape_parse_result(get_default_validator().validate_result(result), options)
+
+def _read_model_text(path: Path) -> Optional[str]:
+    # 文件不存在返回 None
+    chunks = _read_model_file(path)
+    return None if chunks is None else "".join(chunks)
+
+async def _parse_model_file(path: Path, typed: bool) -> Optional[Dict[str, Any]]:
+    # 文件不存在返回 None；读取占用 IO 并发名额，解析（内容未变时直接取缓存结果）在普通线程池中执行
+    content = await _run_io(_read_model_text, path)
+    if content is None:
+        return None
+    return await run_in_threadpool(PARSE_CACHE.parse, content, path.name, typed)
+
+def _diff_contents(old: Any, content: str, filename: str) -> Dict[str, Any]:
+    # old 可以是文本，也可以是已解析的结果
+    a = old if isinstance(old, dict) else parse_text_bin(old, filename, typed=True)
+    b = parse_text_bin(content, filename, typed=True)
+    return {"success": True, **diff_text_bin(a, b)}
+
 
 # 2) 两个 JSON：模型字典 + 寄存器定义
 @app.get("/api/model/dictionary")
-def get_model_dictionary():
-    return _read_json(MODEL_DICT_PATH)
+async def get_model_dictionary(request: Request):
+    return await MODEL_DICT_CACHE.response(request)
 
 
 @app.get("/api/register/definitions")
-def get_register_definitions():
-    return _read_json(REG_DEF_PATH)
+async def get_register_definitions(request: Request):
+    return await REG_DEF_CACHE.response(request)
 
 #
 # 2.1) 从 resource/ 读取模型文件（HTTP）
 #
 @app.get("/api/model/list")
-def api_model_list(device_sn: Optional[str] = None):
-    base = _resource_dir_for_device(device_sn)
-    return {"success": True, "device_sn": device_sn, "base": str(base), "files": _list_bin_files(base)}
+async def api_model_list(device_sn: Optional[str] = None):
+    base = await _run_io(_resource_dir_for_device, device_sn)
+    return {"success": True, "device_sn": device_sn, "base": str(base), "files": await _run_io(_list_bin_files, base)}
 
 @app.get("/api/model/get")
-def api_model_get(filename: str, device_sn: Optional[str] = None):
-    base = _resource_dir_for_device(device_sn)
+async def api_model_get(filename: str, device_sn: Optional[str] = None):
+    base = await _run_io(_resource_dir_for_device, device_sn)
+    fn = _safe_name(filename)
+    content = await _run_io(_read_model_file, base / fn)
+    if content is None:
+        return JSONResponse({"success": False, "error": "文件不存在", "filename": fn}, status_code=404)
+    body = await run_in_threadpool(_dumps_json, {"success": True, "filename": fn, "content": _TEXT_SLOT}, content)
+    return Response(body, media_type="application/json")
+
+@app.get("/api/model/getParsed")
+async def api_model_get_parsed(
+    filename: str,
+    device_sn: Optional[str] = None,
+    typed: bool = False,
+    format: Optional[str] = None,
+    raw: bool = False,
+    lineNum: bool = True,
+    packMatrices: bool = True,
+):
+    # 读取并解析模型文件（一次请求代替 model/get + bin/parse），返回格式同 /api/bin/parse
+    base = await _run_io(_resource_dir_for_device, device_sn)
     fn = _safe_name(filename)
-    p = base / fn
-    if not p.exists():
+    result = await _parse_model_file(base / fn, typed)
+    if result is None:
         return JSONResponse({"success": False, "error": "文件不存在", "filename": fn}, status_code=404)
-    return {"success": True, "filename": fn, "content": _read_text_file(p)}
+    options = {"format": format, "raw": raw, "lineNum": lineNum, "packMatrices": packMatrices}
+    result = await run_in_threadpool(_check_parse_result, result, options)
+    body = await run_in_threadpool(_dumps_json, result)
+    return Response(body, media_type="application/json")
 
 @app.post("/api/model/save")
 async def api_model_save(payload: Dict[str, Any]):
     device_sn = payload.get("device_sn")
     filename = _safe_name(payload.get("filename") or "")
     content = payload.get("content") or ""
-    base = _resource_dir_for_device(device_sn)
-    _write_text_file(base / filename, content)
+    base = await _run_io(_resource_dir_for_device, device_sn)
+    await _run_io(_write_text_file, base / filename, content)
     return {"success": True, "filename": filename}
 
 
@@ -116,138 +442,391 @@ async def api_model_save(payload: Dict[str, Any]):
 async def api_bin_parse(payload: Dict[str, Any]):
     content = payload.get("content") or ""
     filename = payload.get("filename") or "unknown.bin"
-    return parse_text_bin(content, filename)
+    result = await run_in_threadpool(PARSE_CACHE.parse, content, filename, bool(payload.get("typed")))
+    result = await run_in_threadpool(_check_parse_result, result, payload)
+    # 自行序列化（typed=True 时数值数组为 array），在线程池中分块进行
+    return Response(await run_in_threadpool(_dumps_json, result), media_type="application/json")
 
 
 @app.post("/api/bin/build")
 async def api_bin_build(payload: Dict[str, Any]):
     # payload 可以直接是 parse_text_bin 的输出，也可以是 {modules:[...]} 结构
-    return {"success": True, "content": build_text_bin(payload)}
+    # 可选 float_precision：浮点数按固定小数位输出
+    return {"success": True, "content": build_text_bin(payload, float_precision=payload.get("float_precision"))}
+
+
+@app.post("/api/bin/diff")
+async def api_bin_diff(payload: Dict[str, Any]):
+    # 比较两份文本 bin：old 为修改前内容，content 为修改后内容
+    # 两次解析加比较都在线程池中执行
+    result = await run_in_threadpool(_diff_contents, payload.get("old") or "", payload.get("content") or "", "unknown")
+    return Response(await run_in_threadpool(_dumps_json, result), media_type="application/json")
 
 
 # 4) WebSocket：兼容前端 WSClient 的 {id, action, params} 协议
+#
+# action 通过 @ws_action 注册到 WS_ACTIONS，新旧两种协议解析出 action 名后都经由这张表分发；
+# 每个 action 的调用次数、耗时分布和收发字节数记录在 ACTION_STATS，可通过 server.stats 查询。
+
+# 耗时直方图的桶上界（毫秒），最后还有一个 +Inf 桶
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class _ActionStats:
+    """单个 action 的调用统计"""
+
+    __slots__ = ("count", "errors", "total_ms", "max_ms", "buckets", "bytes_in", "bytes_out", "max_bytes_in", "max_bytes_out")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.max_bytes_in = 0
+        self.max_bytes_out = 0
+
+    def record(self, elapsed_ms: float, bytes_in: int, bytes_out: int, failed: bool) -> None:
+        self.count += 1
+        self.errors += 1 if failed else 0
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.max_bytes_in = max(self.max_bytes_in, bytes_in)
+        self.max_bytes_out = max(self.max_bytes_out, bytes_out)
+
+    def _quantile_ms(self, q: float) -> Optional[float]:
+        # 按直方图估计分位数：返回所在桶的上界（落在 +Inf 桶时返回最大值）
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return float(bound)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avgMs": round(self.total_ms / self.count, 3) if self.count else None,
+            "maxMs": round(self.max_ms, 3),
+            "p50Ms": self._quantile_ms(0.5),
+            "p99Ms": self._quantile_ms(0.99),
+            "histogram": {"leMs": list(LATENCY_BUCKETS_MS) + ["+Inf"], "counts": list(self.buckets)},
+            "bytesIn": self.bytes_in,
+            "bytesOut": self.bytes_out,
+            "maxBytesIn": self.max_bytes_in,
+            "maxBytesOut": self.max_bytes_out,
+        }
+
+
+def _utf8_len(text: str) -> int:
+    # 文本按 UTF-8 编码后的字节数（纯 ASCII 时无需编码）
+    return len(text) if text.isascii() else len(text.encode("utf-8", "surrogatepass"))
+
+
+WS_ACTIONS: Dict[str, Callable[["_WsRequest"], Awaitable[None]]] = {}
+ACTION_STATS: Dict[str, _ActionStats] = defaultdict(_ActionStats)
+
+
+def ws_action(*names: str):
+    """
+    注册 WebSocket action 处理函数（可同时注册多个名称）
+
+        @ws_action("model.list", "file.list")
+        async def _ws_model_list(r: _WsRequest):
+            await r.reply_ok({...})
+    """
+    def decorator(func):
+        for name in names:
+            if name in WS_ACTIONS:
+                raise ValueError(f"action 重复注册: {name}")
+            WS_ACTIONS[name] = func
+        return func
+    return decorator
+
+
+class _WsConnection:
+    """一个 WebSocket 连接的状态"""
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.send_lock = asyncio.Lock()
+        # 以下均按文件键 (device_sn, filename) 区分（device_sn 决定所在目录），见 _WsRequest.file_key
+        # 本连接上每个文件最近一次 bin.parse / model.getParsed 的结果，供 incremental 增量解析和 bin.diff 使用
+        self.last_parsed: Dict[Any, Any] = {}
+        # 同一文件的读、写、删除、解析按到达顺序串行
+        self.file_locks: Dict[Any, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # 客户端断开后置为 True，之后的回复直接丢弃
+        self.closed = False
+
+    async def send(self, text: str) -> int:
+        if self.closed:
+            return 0
+        async with self.send_lock:
+            await self.ws.send_text(text)
+        return _utf8_len(text)
+
+
+class _WsRequest:
+    """
+    一次请求：兼容两种协议
+    1) 旧协议：{ "id": 1, "action": "xxx", "params": {...} }
+    2) 新协议：{ "topic": "xxx", "cmd_id": 123, "name": "xxx", "data": "JSON_STRING" }
+    """
+
+    def __init__(self, conn: _WsConnection, req: Dict[str, Any]):
+        self.conn = conn
+        self.req = req
+        self.req_id = req.get("cmd_id") or req.get("id")
+        action = req.get("name") or req.get("action")
+        # 非字符串的名称（如列表）无法作为 WS_ACTIONS / ACTION_STATS 的键，按未知 action 处理
+        self.action: Optional[str] = action if isinstance(action, str) else None
+        self.bytes_out = 0
+
+        raw_data = req.get("data")
+        params = {}
+        if isinstance(raw_data, str):
+            try:
+                params = json.loads(raw_data)
+            except:
+                params = {}
+        elif isinstance(raw_data, dict):
+            params = raw_data
+        else:
+            params = req.get("params") or {}
+        self.params: Dict[str, Any] = params
+
+    def file_key(self, filename: str) -> Any:
+        return (self.params.get("device_sn") or "", filename)
+
+    def file_lock(self, filename: str) -> asyncio.Lock:
+        # 必须在处理函数的第一个 await 之前取锁，才能保证同一文件的请求按到达顺序执行
+        return self.conn.file_locks[self.file_key(filename)]
+
+    async def reply_ok(self, data: Any, text: Optional[List[str]] = None, raw: Optional[str] = None):
+        # 响应格式也需要兼容：
+        # 新协议：{ "topic": "...", "cmd_id": 123, "name": "xxx", "data": {...} }
+        # text：data 中值为 _TEXT_SLOT 的字段内容（按块读取的文件正文），在线程池中序列化
+        # raw：已序列化好的 data（data 传 _TEXT_SLOT）
+        payload = {
+            "topic": self.req.get("topic", "LOADER"),
+            "cmd_id": self.req_id,
+            "name": self.action,
+            "data": data
+        }
+        if raw is not None:
+            # 已序列化好的回复只需拼接，直接在事件循环中完成
+            self.bytes_out += await self.conn.send(_dumps_json(payload, raw=raw))
+        else:
+            # 解析结果等回复可能很大，在线程池中分块序列化，不阻塞其他连接
+            self.bytes_out += await self.conn.send(await run_in_threadpool(_dumps_json, payload, text))
+
+    async def reply_err(self, err: str):
+        payload = {
+            "topic": self.req.get("topic", "LOADER"),
+            "cmd_id": self.req_id,
+            "name": self.action,
+            "data": {"ret": False, "desc": err, "success": False, "error": err}
+        }
+        self.bytes_out += await self.conn.send(json.dumps(payload, ensure_ascii=False))
+
+
+# ---- actions ----
+@ws_action("model.dictionary")
+async def _ws_model_dictionary(r: _WsRequest):
+    await r.reply_ok(_TEXT_SLOT, raw=(await _run_io(MODEL_DICT_CACHE.get)).ws_json)
+
+
+@ws_action("register.definitions")
+async def _ws_register_definitions(r: _WsRequest):
+    await r.reply_ok(_TEXT_SLOT, raw=(await _run_io(REG_DEF_CACHE.get)).ws_json)
+
+
+# 文件接口（模型编辑页“保存/另存为/读取/列表”会用到）
+@ws_action("model.list", "file.list")
+async def _ws_file_list(r: _WsRequest):
+    base = await _run_io(_resource_dir_for_device, r.params.get("device_sn"))
+    await r.reply_ok({"success": True, "files": await _run_io(_list_bin_files, base)})
+
+
+@ws_action("model.get", "file.read")
+async def _ws_file_read(r: _WsRequest):
+    filename = _safe_name(r.params.get("filename") or "")
+    async with r.file_lock(filename):
+        base = await _run_io(_resource_dir_for_device, r.params.get("device_sn"))
+        content = await _run_io(_read_model_file, base / filename)
+    if content is None:
+        await r.reply_ok({"success": False, "error": "文件不存在", "filename": filename})
+    else:
+        await r.reply_ok({"success": True, "content": _TEXT_SLOT, "filename": filename}, content)
+
+
+@ws_action("file.save")
+async def _ws_file_save(r: _WsRequest):
+    filename = _safe_name(r.params.get("filename") or "")
+    content = r.params.get("content") or ""
+    async with r.file_lock(filename):
+        base = await _run_io(_resource_dir_for_device, r.params.get("device_sn"))
+        await _run_io(_write_text_file, base / filename, content)
+    await r.reply_ok({"success": True})
+
+
+@ws_action("file.saveAs")
+async def _ws_file_save_as(r: _WsRequest):
+    filename = _safe_name(r.params.get("filename") or "")
+    content = r.params.get("content") or ""
+    async with r.file_lock(filename):
+        base = await _run_io(_resource_dir_for_device, r.params.get("device_sn"))
+        saved = await _run_io(_save_as, base / filename, content)
+    if saved:
+        await r.reply_ok({"success": True})
+    else:
+        await r.reply_ok({"success": False, "error": "文件已存在"})
+
+
+@ws_action("file.delete")
+async def _ws_file_delete(r: _WsRequest):
+    filename = _safe_name(r.params.get("filename") or "")
+    async with r.file_lock(filename):
+        base = await _run_io(_resource_dir_for_device, r.params.get("device_sn"))
+        deleted = await _run_io(_delete_file, base / filename)
+    if deleted:
+        await r.reply_ok({"success": True})
+    else:
+        await r.reply_ok({"success": False, "error": "文件不存在"})
+
+
+@ws_action("bin.parse")
+async def _ws_bin_parse(r: _WsRequest):
+    params = r.params
+    content = params.get("content") or ""
+    filename = params.get("filename") or "unknown.bin"
+    typed = bool(params.get("typed"))
+    last_parsed = r.conn.last_parsed
+    key = r.file_key(filename)
+    # incremental=True：与本连接上次解析的同名文件比较，只重新解析变化的模块
+    # 可选 edits=[[起始行, 删除行数, 插入行数], ...]（基于上次内容的行号）
+    # 与同一文件的其他请求按到达顺序串行（edits 基于上一次的内容），解析在线程池中执行
+    async with r.file_lock(filename):
+        prev = last_parsed.get(key) if params.get("incremental") else None
+        if prev is not None and prev[0] == typed:
+            edits = params.get("edits")
+            edits = [tuple(e) for e in edits] if edits is not None else None
+            result = await run_in_threadpool(reparse_text_bin, prev[1], content, edits, filename, typed)
+        else:
+            # 内容与之前解析过的相同时直接取缓存（增量解析的结果不进缓存）
+            result = await run_in_threadpool(PARSE_CACHE.parse, content, filename, typed)
+        # 缓存未校验的结果（增量解析要用），回复校验后的副本
+        last_parsed[key] = (typed, result)
+    await r.reply_ok(await run_in_threadpool(_check_parse_result, result, params))
+
+
+@ws_action("model.getParsed")
+async def _ws_model_get_parsed(r: _WsRequest):
+    # 读取并解析模型文件：一次往返代替 model.get + bin.parse；参数和返回格式同 bin.parse
+    # 结果也记为本连接该文件最近一次的解析结果，之后可以直接 incremental bin.parse
+    filename = _safe_name(r.params.get("filename") or "")
+    typed = bool(r.params.get("typed"))
+    # 先取锁再做任何 await，保证与同一文件的 file.save、bin.parse 等按到达顺序执行
+    async with r.file_lock(filename):
+        base = await _run_io(_resource_dir_for_device, r.params.get("device_sn"))
+        result = await _parse_model_file(base / filename, typed)
+        if result is not None:
+            r.conn.last_parsed[r.file_key(filename)] = (typed, result)
+    if result is None:
+        await r.reply_ok({"success": False, "error": "文件不存在", "filename": filename})
+    else:
+        await r.reply_ok(await run_in_threadpool(_check_parse_result, result, r.params))
+
+
+@ws_action("bin.diff")
+async def _ws_bin_diff(r: _WsRequest):
+    # 与 old 比较；不传 old 时与本连接上次 bin.parse 的同名文件比较
+    filename = r.params.get("filename") or "unknown.bin"
+    # 等排在前面的同一文件的 bin.parse 完成后再取上次的结果
+    async with r.file_lock(filename):
+        prev = r.conn.last_parsed.get(r.file_key(filename))
+    old = prev[1] if r.params.get("old") is None and prev is not None else r.params.get("old") or ""
+    await r.reply_ok(await run_in_threadpool(_diff_contents, old, r.params.get("content") or "", filename))
+
+
+@ws_action("bin.build")
+async def _ws_bin_build(r: _WsRequest):
+    content = await run_in_threadpool(build_text_bin, r.params, r.params.get("float_precision"))
+    await r.reply_ok({"success": True, "content": content})
+
+
+@ws_action("server.stats")
+async def _ws_server_stats(r: _WsRequest):
+    # 各 action 的调用统计和解析缓存命中情况；reset=true 时返回后清零
+    stats = {name: st.to_dict() for name, st in sorted(ACTION_STATS.items())}
+    if r.params.get("reset"):
+        ACTION_STATS.clear()
+    await r.reply_ok({"success": True, "actions": stats, "parseCache": PARSE_CACHE.info()})
+
+
 @app.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
     await ws.accept()
-    try:
-        while True:
-            msg = await ws.receive_text()
+    conn = _WsConnection(ws)
+    # 每个请求作为单独的任务处理，完成即回复（靠 cmd_id 对应）；
+    # 同时处理的请求达到 WS_CONCURRENCY 时暂停接收，形成背压
+    slots = asyncio.Semaphore(WS_CONCURRENCY)
+    tasks: Set[asyncio.Task] = set()
+
+    async def handle(msg: str):
+        r: Optional[_WsRequest] = None
+        failed = False
+        started = time.perf_counter()
+        try:
             try:
-                # 兼容两种协议：
-                # 1) 旧协议：{ "id": 1, "action": "xxx", "params": {...} }
-                # 2) 新协议：{ "topic": "xxx", "cmd_id": 123, "name": "xxx", "data": "JSON_STRING" }
-                req = json.loads(msg)
-                
-                # 提取参数
-                req_id = req.get("cmd_id") or req.get("id")
-                action = req.get("name") or req.get("action")
-                raw_data = req.get("data")
-                
-                params = {}
-                if isinstance(raw_data, str):
-                    try:
-                        params = json.loads(raw_data)
-                    except:
-                        params = {}
-                elif isinstance(raw_data, dict):
-                    params = raw_data
-                else:
-                    params = req.get("params") or {}
-
-                async def reply_ok(data: Dict[str, Any]):
-                    # 响应格式也需要兼容：
-                    # 新协议：{ "topic": "...", "cmd_id": 123, "name": "xxx", "data": {...} }
-                    payload = {
-                        "topic": req.get("topic", "LOADER"),
-                        "cmd_id": req_id,
-                        "name": action,
-                        "data": data
-                    }
-                    await ws.send_text(json.dumps(payload, ensure_ascii=False))
-
-                async def reply_err(err: str):
-                    payload = {
-                        "topic": req.get("topic", "LOADER"),
-                        "cmd_id": req_id,
-                        "name": action,
-                        "data": {"ret": False, "desc": err, "success": False, "error": err}
-                    }
-                    await ws.send_text(json.dumps(payload, ensure_ascii=False))
-
-                # ---- actions ----
-                if action == "model.dictionary":
-                    await reply_ok({"success": True, **_read_json(MODEL_DICT_PATH)})
-                elif action == "model.list":
-                    device_sn = params.get("device_sn")
-                    base = _resource_dir_for_device(device_sn)
-                    await reply_ok({"success": True, "files": _list_bin_files(base)})
-                elif action == "model.get":
-                    device_sn = params.get("device_sn")
-                    filename = _safe_name(params.get("filename") or "")
-                    base = _resource_dir_for_device(device_sn)
-                    p = base / filename
-                    if not p.exists():
-                        await reply_ok({"success": False, "error": "文件不存在", "filename": filename})
-                    else:
-                        await reply_ok({"success": True, "content": _read_text_file(p), "filename": filename})
-                elif action == "register.definitions":
-                    data = _read_json(REG_DEF_PATH)
-                    # 允许文件是 {definitions: []} 或 []
-                    defs = data if isinstance(data, list) else data.get("definitions", [])
-                    await reply_ok({"success": True, "definitions": defs})
-                # 文件接口（模型编辑页“保存/另存为/读取/列表”会用到）
-                elif action == "file.list":
-                    device_sn = params.get("device_sn")
-                    base = _resource_dir_for_device(device_sn)
-                    await reply_ok({"success": True, "files": _list_bin_files(base)})
-                elif action == "file.read":
-                    device_sn = params.get("device_sn")
-                    filename = _safe_name(params.get("filename") or "")
-                    base = _resource_dir_for_device(device_sn)
-                    p = base / filename
-                    if not p.exists():
-                        await reply_ok({"success": False, "error": "文件不存在", "filename": filename})
-                    else:
-                        await reply_ok({"success": True, "content": _read_text_file(p), "filename": filename})
-                elif action == "file.save":
-                    device_sn = params.get("device_sn")
-                    filename = _safe_name(params.get("filename") or "")
-                    content = params.get("content") or ""
-                    base = _resource_dir_for_device(device_sn)
-                    _write_text_file(base / filename, content)
-                    await reply_ok({"success": True})
-                elif action == "file.saveAs":
-                    device_sn = params.get("device_sn")
-                    filename = _safe_name(params.get("filename") or "")
-                    content = params.get("content") or ""
-                    base = _resource_dir_for_device(device_sn)
-                    target = base / filename
-                    if target.exists():
-                        await reply_ok({"success": False, "error": "文件已存在"})
-                    else:
-                        _write_text_file(target, content)
-                        await reply_ok({"success": True})
-                elif action == "file.delete":
-                    device_sn = params.get("device_sn")
-                    filename = _safe_name(params.get("filename") or "")
-                    base = _resource_dir_for_device(device_sn)
-                    p = base / filename
-                    if p.exists():
-                        p.unlink()
-                        await reply_ok({"success": True})
-                    else:
-                        await reply_ok({"success": False, "error": "文件不存在"})
-                elif action == "bin.parse":
-                    content = params.get("content") or ""
-                    filename = params.get("filename") or "unknown.bin"
-                    await reply_ok(parse_text_bin(content, filename))
-                elif action == "bin.build":
-                    await reply_ok({"success": True, "content": build_text_bin(params)})
+                r = _WsRequest(conn, json.loads(msg))
+                handler = WS_ACTIONS.get(r.action)
+                if handler is None:
+                    failed = True
+                    await r.reply_err(f"未知 action: {r.action}")
                 else:
-                    await reply_err(f"未知 action: {action}")
+                    await handler(r)
             except Exception as e:
-                await ws.send_text(json.dumps({"success": False, "error": str(e)}, ensure_ascii=False))
+                failed = True
+                if r is not None:
+                    # 带 cmd_id 回复，客户端据此结束对应的请求
+                    await r.reply_err(str(e))
+                else:
+                    # 消息本身无法解析，没有 cmd_id 可以对应
+                    await conn.send(json.dumps({"success": False, "error": str(e)}, ensure_ascii=False))
+        except Exception:
+            # 连接已断开等情况，回复发送失败时放弃
+            pass
+        finally:
+            slots.release()
+            if r is not None and r.action in WS_ACTIONS:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                ACTION_STATS[r.action].record(elapsed_ms, _utf8_len(msg), r.bytes_out, failed)
+
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                msg = await ws.receive_text()
+            except BaseException:
+                slots.release()
+                raise
+            task = asyncio.create_task(handle(msg))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
     except WebSocketDisconnect:
         pass
-
-
+    finally:
+        conn.closed = True
+        # 断开后仍等已收到的请求执行完（如 file.save），只是回复发不出去
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -3,9 +3,15 @@
 """
 
 from .bridge import DeviceBridge
-from .bin_parser import BinParser, parse_bin_file, save_bin_file
+from .bin_parser import (
+    BinParser, LazyBinFile, ParamTable, ParseCache,
+    parse_bin_file, save_bin_file, patch_bin_file, verify_bin_file
+)
 
-__all__ = ['DeviceBridge', 'BinParser', 'parse_bin_file', 'save_bin_file']
+__all__ = [
+    'DeviceBridge', 'BinParser', 'LazyBinFile', 'ParamTable', 'ParseCache',
+    'parse_bin_file', 'save_bin_file', 'patch_bin_file', 'verify_bin_file',
+]
 
 
 
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量检查 resource 目录下的模型文件
+
+对 RESOURCE_DIR/*.bin 以及每个设备子目录 RESOURCE_DIR/{device_sn}/*.bin
+做文本 bin 解析 + 参数范围校验，多进程并行，每检查完一个文件就输出一行
+JSON 报告，最后输出汇总。
+
+增量模式（--state）：记录每个文件的大小、修改时间和 sha256，
+内容哈希未变的文件不再解析。加 --trust-mtime 时，大小和修改时间都未变的
+文件连哈希也不计算（同一时间戳内改写的文件会被漏检，默认不开启）。
+状态文件同时记录模型字典的摘要，字典变了则全部重新检查。
+
+用法:
+    python -m python_bridge.batch_check <resource目录> [--workers N]
+           [--state 状态文件.json] [--trust-mtime] [--dictionary model_dictionary.json]
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .bin_parser_text import iter_text_bin_modules
+from .model_validator import DEFAULT_DICTIONARY_PATH, ModelValidator, load_dictionary
+
+
+_worker_validator: Optional[ModelValidator] = None
+
+
+def find_model_files(resource_dir: Path) -> List[Path]:
+    """resource 根目录和一级设备子目录下的所有 .bin 文件"""
+    files = sorted(resource_dir.glob("*.bin"))
+    for sub in sorted(p for p in resource_dir.iterdir() if p.is_dir()):
+        files.extend(sorted(sub.glob("*.bin")))
+    return [p for p in files if p.is_file()]
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_file(path: Path, validator: ModelValidator, known_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    解析并校验单个文件
+
+    known_hash 与文件当前哈希相同时不解析，返回 unchanged=True 的报告
+    """
+    sha256 = _file_hash(path)
+    if sha256 == known_hash:
+        return {"file": str(path), "sha256": sha256, "unchanged": True}
+    report: Dict[str, Any] = {"file": str(path), "sha256": sha256}
+
+    errors: List[Dict[str, Any]] = []
+    warnings: List[Dict[str, Any]] = []
+    module_count = 0
+    # 按模块流式解析，内存只与最大的模块有关
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        for mod in iter_text_bin_modules(f):
+            errors.extend(mod.pop("errors"))
+            warnings.extend(mod.pop("warnings"))
+            if mod["name"] is None:
+                continue
+            module_count += 1
+            mod_errors, mod_warnings = validator.validate_module(mod)
+            errors.extend(mod_errors)
+            warnings.extend(mod_warnings)
+
+    report.update({
+        "success": len(errors) == 0,
+        "modules": module_count,
+        "errors": errors,
+        "warnings": warnings,
+    })
+    return report
+
+
+def _init_worker(dictionary: Dict[str, Any]) -> None:
+    # 每个工作进程只编译一次字典
+    global _worker_validator
+    _worker_validator = ModelValidator(dictionary)
+
+
+def _check_in_worker(path: str, known_hash: Optional[str]) -> Dict[str, Any]:
+    try:
+        return check_file(Path(path), _worker_validator, known_hash)
+    except Exception as e:
+        return {"file": path, "success": False, "errors": [{"lineNum": 0, "message": f"检查失败: {e}", "type": "error"}], "warnings": []}
+
+
+def _dictionary_digest(dictionary: Dict[str, Any]) -> str:
+    text = json.dumps(dictionary, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _load_state(state_path: Optional[Path], dictionary_digest: str) -> Dict[str, Any]:
+    # 状态文件格式：{"dictionary": 字典摘要, "files": {路径: 状态}}；
+    # 字典摘要不同（或旧格式）时丢弃，所有文件重新检查
+    if state_path is None or not state_path.exists():
+        return {}
+    state = json.loads(state_path.read_text(encoding="utf-8"))
+    if state.get("dictionary") != dictionary_digest:
+        return {}
+    return state.get("files") or {}
+
+
+def _save_state(state_path: Path, dictionary_digest: str, files: Dict[str, Any]) -> None:
+    tmp = state_path.with_name(state_path.name + ".tmp")
+    state = {"dictionary": dictionary_digest, "files": files}
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, state_path)
+
+
+def iter_check_resource_dir(
+    resource_dir: Any,
+    dictionary: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    state_path: Any = None,
+    trust_mtime: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    并行检查整个 resource 目录，按完成顺序逐个产出文件报告
+
+    Args:
+        resource_dir: resource 目录（包含设备子目录）
+        dictionary: 模型字典，默认读取 data/model_dictionary.json
+        workers: 进程数，默认 CPU 核数
+        state_path: 增量状态文件；传入时跳过未变化的文件，结束后更新状态
+                    （跳过的文件产出 skipped=True 的报告，沿用上次的结果）；
+                    模型字典与上次不同时不跳过任何文件
+        trust_mtime: 为 True 时，大小和修改时间与状态相同的文件不计算哈希直接跳过；
+                     默认每个文件都计算哈希后比较
+    """
+    resource_dir = Path(resource_dir)
+    if dictionary is None:
+        dictionary = load_dictionary()
+    state_path = Path(state_path) if state_path is not None else None
+    dictionary_digest = _dictionary_digest(dictionary)
+    old_state = _load_state(state_path, dictionary_digest)
+    new_state: Dict[str, Any] = {}
+
+    pending: Dict[str, os.stat_result] = {}
+    for path in find_model_files(resource_dir):
+        key = str(path)
+        st = path.stat()
+        prev = old_state.get(key)
+        if trust_mtime and prev and prev.get("size") == st.st_size and prev.get("mtime_ns") == st.st_mtime_ns:
+            new_state[key] = prev
+            yield {**prev["report"], "skipped": True}
+        else:
+            pending[key] = st
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dictionary,)) as pool:
+            futures = {
+                pool.submit(_check_in_worker, key, (old_state.get(key) or {}).get("sha256")): key
+                for key in pending
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                report = future.result()
+                st = pending[key]
+                if report.get("unchanged"):
+                    # 内容没变：沿用上次的结果
+                    report = {**old_state[key]["report"], "skipped": True}
+                    new_state[key] = {**old_state[key], "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                elif "sha256" in report:
+                    new_state[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                      "sha256": report["sha256"], "report": report}
+                yield report
+    finally:
+        if state_path is not None:
+            _save_state(state_path, dictionary_digest, new_state)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    if not args or args[0].startswith("-"):
+        print(__doc__.strip())
+        return 1
+
+    resource_dir = Path(args.pop(0))
+    options: Dict[str, str] = {}
+    trust_mtime = False
+    while args:
+        flag = args.pop(0)
+        if flag == "--trust-mtime":
+            trust_mtime = True
+            continue
+        if flag not in ("--workers", "--state", "--dictionary") or not args:
+            print(f"参数错误: {flag}")
+            return 1
+        options[flag] = args.pop(0)
+
+    dictionary = load_dictionary(options.get("--dictionary", DEFAULT_DICTIONARY_PATH))
+    workers = int(options["--workers"]) if "--workers" in options else None
+
+    summary = {"files": 0, "skipped": 0, "failed": 0, "errors": 0, "warnings": 0}
+    for report in iter_check_resource_dir(resource_dir, dictionary, workers, options.get("--state"), trust_mtime):
+        summary["files"] += 1
+        summary["skipped"] += 1 if report.get("skipped") else 0
+        summary["failed"] += 0 if report.get("success", True) else 1
+        summary["errors"] += len(report.get("errors") or [])
+        summary["warnings"] += len(report.get("warnings") or [])
+        print(json.dumps(report, ensure_ascii=False), flush=True)
+
+    print(json.dumps({"summary": summary}, ensure_ascii=False), flush=True)
+    return 0 if summary["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,10 +7,17 @@ Bin文件解析器
 注意：此文件中的结构定义需要根据实际bin文件格式进行调整
 """
 
+import hashlib
+import mmap
+import os
 import struct
+import sys
+import threading
 import json
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
+from collections import OrderedDict
+from array import array
+from typing import BinaryIO, Dict, Iterator, List, Any, Optional, Tuple
+from dataclasses import dataclass, asdict, replace
 from enum import IntEnum
 
 
@@ -50,6 +57,53 @@ class ParamEntry:
     min_val: Optional[float] = None  # 最小值
     max_val: Optional[float] = None  # 最大值
     description: str = ""     # 描述
+    elem_type: Optional[ParamType] = None  # 数组元素类型（仅 ARRAY）
+
+
+# ============ 预编译编解码器 ============
+
+# 文件头：[魔数(5)] [版本(1)] [参数数量(2)] [校验和(4)] [时间戳(4)] [保留(16)]
+HEADER_CODEC = struct.Struct('>5sBHII16s')
+# 参数条目头：[参数ID(2)] [类型(1)] [名称长度(1)]
+PARAM_HEAD_CODEC = struct.Struct('>HBB')
+# 数组头：[长度(2)] [元素类型(1)]
+ARRAY_HEAD_CODEC = struct.Struct('>HB')
+# 字符串长度前缀
+STR_LEN_CODEC = struct.Struct('>H')
+# 校验和字段（位于文件头偏移 8 处）
+CHECKSUM_CODEC = struct.Struct('>I')
+CHECKSUM_OFFSET = 8
+CHECKSUM_MASK = 0xFFFFFFFF
+
+
+# ============ 校验和 ============
+# 校验和 = 除校验和字段外所有字节之和（取低32位）。
+# 字节和与位置无关，因此修改任意区域后都可以只根据新旧字节增量更新。
+
+def calculate_checksum(data: bytes) -> int:
+    """计算整块数据的字节和（内置 sum 在 C 层遍历缓冲区）"""
+    return sum(data) & CHECKSUM_MASK
+
+
+def update_checksum(checksum: int, old: bytes, new: bytes) -> int:
+    """
+    增量更新校验和
+    
+    Args:
+        checksum: 修改前的校验和
+        old: 被替换区域原来的字节
+        new: 该区域新的字节（长度可以不同）
+    """
+    return (checksum - sum(old) + sum(new)) & CHECKSUM_MASK
+
+
+def verify_checksum(data: bytes) -> bool:
+    """校验文件数据中存储的校验和，不解析参数"""
+    if len(data) < HEADER_CODEC.size:
+        return False
+    stored = CHECKSUM_CODEC.unpack_from(data, CHECKSUM_OFFSET)[0]
+    field = data[CHECKSUM_OFFSET:CHECKSUM_OFFSET + CHECKSUM_CODEC.size]
+    return update_checksum(calculate_checksum(data), field, b'') == stored
 
 
 class BinParser:
@@ -67,6 +121,16 @@ class BinParser:
         ParamType.FLOAT64: 'd',
     }
     
+    # 定长类型的预编译编解码器，避免每个值都重新拼接格式串
+    TYPE_CODEC = {t: struct.Struct('>' + f) for t, f in TYPE_FORMAT.items()}
+    
+    # 定长数组元素对应的 array 类型码（struct 格式字符与 array 类型码一致，
+    # 仅保留本机 itemsize 与文件格式宽度相同的类型）
+    ARRAY_TYPECODE = {
+        t: f for t, f in TYPE_FORMAT.items()
+        if array(f).itemsize == struct.calcsize('>' + f)
+    }
+    
     def __init__(self):
         self.header: Optional[BinHeader] = None
         self.params: List[ParamEntry] = []
@@ -76,7 +140,8 @@ class BinParser:
         解析bin文件数据
         
         Args:
-            data: bin文件的字节数据
+            data: bin文件的字节数据（也可以是 memoryview / mmap 等缓冲区对象，
+                  解析时只在生成 Python 值时才复制数据）
             
         Returns:
             解析后的参数字典
@@ -97,7 +162,29 @@ class BinParser:
         # 转换为字典格式
         return self._to_dict()
     
-    def build(self, params: Dict[str, Any]) -> bytes:
+    def parse_table(self, data: bytes) -> 'ParamTable':
+        """
+        解析bin文件数据为紧凑的列式参数表
+        
+        与 parse() 不同，不创建 ParamEntry 和嵌套字典，字典/JSON 形式
+        由 ParamTable.to_dict()/write_json() 按需生成。
+        
+        Args:
+            data: bin文件的字节数据（同 parse()）
+        """
+        self.header = self._parse_header(data, 0)
+        self.params = []
+        table = ParamTable(self.header)
+        
+        offset = HEADER_CODEC.size
+        for _ in range(self.header.param_count):
+            param_id, param_type, name, value, elem_type, size = self._decode_param(data, offset)
+            table.append(param_id, param_type, name, value, elem_type)
+            offset += size
+        
+        return table
+    
+    def build(self, params: Dict[str, Any]) -> bytearray:
         """
         将参数字典构建为bin文件格式
         
@@ -105,90 +192,183 @@ class BinParser:
             params: 参数字典
             
         Returns:
-            bin文件的字节数据
+            bin文件的字节数据（直接返回输出缓冲区，不再额外复制）
         """
         # 从字典恢复参数列表
         self._from_dict(params)
         
-        # 构建头部
-        header_data = self._build_header()
+        # 预先计算总长度，一次分配输出缓冲区
+        name_bytes = [param.name.encode('utf-8') for param in self.params]
+        total_size = HEADER_CODEC.size + sum(
+            PARAM_HEAD_CODEC.size + len(name) + self._value_size(param.value, param.type, param.elem_type)
+            for param, name in zip(self.params, name_bytes)
+        )
+        buf = bytearray(total_size)
+        
+        # 构建头部（校验和先置0）
+        self._build_header_into(buf)
         
-        # 构建参数数据
-        params_data = b''
-        for param in self.params:
-            params_data += self._build_param(param)
+        # 顺序写入参数数据
+        offset = HEADER_CODEC.size
+        for param, name in zip(self.params, name_bytes):
+            offset = self._write_param(buf, offset, param, name)
+        
+        # 计算校验和并原地更新头部
+        checksum = self._calculate_checksum(buf)
+        CHECKSUM_CODEC.pack_into(buf, CHECKSUM_OFFSET, checksum)
         
-        # 计算校验和并更新头部
-        full_data = header_data + params_data
-        checksum = self._calculate_checksum(full_data)
+        return buf
+    
+    def iter_params(self, stream: BinaryIO) -> Iterator[ParamEntry]:
+        """
+        流式解析：从文件对象中逐个产出参数
+        
+        先读取32字节头部（保存到 self.header），之后每个参数只读取它
+        需要的字节数，内存占用只与单个参数大小有关。stream 可以是普通
+        文件，也可以是 socket.makefile('rb')，数据边到达边解析。
+        产出的参数不会累积到 self.params。
+        
+        Args:
+            stream: 以二进制方式打开的文件对象（需支持 read）
+        """
+        self.header = self._parse_header(_read_exact(stream, HEADER_CODEC.size), 0)
         
-        # 更新校验和字段（偏移量根据实际格式调整）
-        full_data = full_data[:12] + struct.pack('>I', checksum) + full_data[16:]
+        for _ in range(self.header.param_count):
+            head = _read_exact(stream, PARAM_HEAD_CODEC.size)
+            name_len = head[-1]
+            name = _read_exact(stream, name_len)
+            param_type = ParamType(head[2])
+            entry = head + name + self._read_value_bytes(stream, param_type)
+            param, _ = self._parse_param(entry, 0)
+            yield param
+    
+    def _read_value_bytes(self, stream: BinaryIO, param_type: ParamType) -> bytes:
+        """从流中读取一个已编码参数值的原始字节"""
+        codec = self.TYPE_CODEC.get(param_type)
+        if codec is not None:
+            return _read_exact(stream, codec.size)
+        elif param_type == ParamType.STRING:
+            prefix = _read_exact(stream, STR_LEN_CODEC.size)
+            return prefix + _read_exact(stream, STR_LEN_CODEC.unpack(prefix)[0])
+        elif param_type == ParamType.ARRAY:
+            head = _read_exact(stream, ARRAY_HEAD_CODEC.size)
+            arr_len, raw_elem = ARRAY_HEAD_CODEC.unpack(head)
+            elem_type = ParamType(raw_elem)
+            elem_codec = self.TYPE_CODEC.get(elem_type)
+            if elem_codec is not None:
+                return head + _read_exact(stream, arr_len * elem_codec.size)
+            return head + b''.join(self._read_value_bytes(stream, elem_type) for _ in range(arr_len))
         
-        return full_data
+        return b''
     
     def _parse_header(self, data: bytes, offset: int) -> BinHeader:
         """解析文件头部"""
         header = BinHeader()
         
-        # 读取魔数
-        header.magic = data[offset:offset+5]
+        # 一次读取魔数、版本、参数数量、校验和与时间戳
+        (header.magic, header.version, header.param_count,
+         header.checksum, header.timestamp, _) = HEADER_CODEC.unpack_from(data, offset)
         if header.magic != b'ELBIN':
             # 可能是旧格式或其他格式，尝试兼容
             pass
         
-        # 读取版本和参数数量
-        header.version = struct.unpack_from('>B', data, offset + 5)[0]
-        header.param_count = struct.unpack_from('>H', data, offset + 6)[0]
-        header.checksum = struct.unpack_from('>I', data, offset + 8)[0]
-        header.timestamp = struct.unpack_from('>I', data, offset + 12)[0]
-        
         return header
     
     def _parse_param(self, data: bytes, offset: int) -> tuple:
         """解析单个参数"""
-        # 读取参数ID和类型
-        param_id = struct.unpack_from('>H', data, offset)[0]
-        param_type = ParamType(struct.unpack_from('>B', data, offset + 2)[0])
-        
-        # 读取名称长度和名称
-        name_len = struct.unpack_from('>B', data, offset + 3)[0]
-        name = data[offset + 4:offset + 4 + name_len].decode('utf-8')
-        
-        current_offset = offset + 4 + name_len
-        
-        # 读取值
-        value, value_size = self._read_value(data, current_offset, param_type)
-        current_offset += value_size
+        param_id, param_type, name, value, elem_type, total_size = self._decode_param(data, offset)
         
         # 创建参数对象
         param = ParamEntry(
             id=param_id,
             type=param_type,
             name=name,
-            value=value
+            value=value,
+            elem_type=elem_type
         )
         
-        total_size = current_offset - offset
         return param, total_size
     
+    def _decode_param(self, data: bytes, offset: int) -> tuple:
+        """解码单个参数，返回 (ID, 类型, 名称, 值, 元素类型, 字节数)"""
+        # 一次读取参数ID、类型和名称长度
+        param_id, raw_type, name_len = PARAM_HEAD_CODEC.unpack_from(data, offset)
+        param_type = ParamType(raw_type)
+        
+        # 读取名称
+        current_offset = offset + PARAM_HEAD_CODEC.size
+        name = str(data[current_offset:current_offset + name_len], 'utf-8')
+        current_offset += name_len
+        
+        # 数组记录真实元素类型，重建时保持不变
+        elem_type = None
+        if param_type == ParamType.ARRAY:
+            elem_type = ParamType(data[current_offset + 2])
+        
+        # 读取值
+        value, value_size = self._read_value(data, current_offset, param_type)
+        current_offset += value_size
+        
+        return param_id, param_type, name, value, elem_type, current_offset - offset
+    
+    def _scan_param(self, data: bytes, offset: int) -> tuple:
+        """跳过单个参数（只解码名称），返回 (参数ID, 名称, 字节数)"""
+        param_id, raw_type, name_len = PARAM_HEAD_CODEC.unpack_from(data, offset)
+        current_offset = offset + PARAM_HEAD_CODEC.size
+        name = str(data[current_offset:current_offset + name_len], 'utf-8')
+        current_offset += name_len
+        current_offset += self._value_span(data, current_offset, ParamType(raw_type))
+        return param_id, name, current_offset - offset
+    
+    def _value_span(self, data: bytes, offset: int, param_type: ParamType) -> int:
+        """计算已编码参数值占用的字节数，不解码值本身"""
+        codec = self.TYPE_CODEC.get(param_type)
+        if codec is not None:
+            return codec.size
+        elif param_type == ParamType.STRING:
+            return STR_LEN_CODEC.size + STR_LEN_CODEC.unpack_from(data, offset)[0]
+        elif param_type == ParamType.ARRAY:
+            arr_len, raw_elem = ARRAY_HEAD_CODEC.unpack_from(data, offset)
+            elem_type = ParamType(raw_elem)
+            elem_codec = self.TYPE_CODEC.get(elem_type)
+            if elem_codec is not None:
+                return ARRAY_HEAD_CODEC.size + arr_len * elem_codec.size
+            current = offset + ARRAY_HEAD_CODEC.size
+            for _ in range(arr_len):
+                current += self._value_span(data, current, elem_type)
+            return current - offset
+        
+        return 0
+    
     def _read_value(self, data: bytes, offset: int, param_type: ParamType) -> tuple:
         """读取参数值"""
-        if param_type in self.TYPE_FORMAT:
-            fmt = '>' + self.TYPE_FORMAT[param_type]
-            size = struct.calcsize(fmt)
-            value = struct.unpack_from(fmt, data, offset)[0]
-            return value, size
+        codec = self.TYPE_CODEC.get(param_type)
+        if codec is not None:
+            return codec.unpack_from(data, offset)[0], codec.size
         elif param_type == ParamType.STRING:
-            str_len = struct.unpack_from('>H', data, offset)[0]
-            value = data[offset + 2:offset + 2 + str_len].decode('utf-8')
-            return value, 2 + str_len
+            str_len = STR_LEN_CODEC.unpack_from(data, offset)[0]
+            start = offset + STR_LEN_CODEC.size
+            value = str(data[start:start + str_len], 'utf-8')
+            return value, STR_LEN_CODEC.size + str_len
         elif param_type == ParamType.ARRAY:
             # 数组：[长度(2)] [元素类型(1)] [元素数据...]
-            arr_len = struct.unpack_from('>H', data, offset)[0]
-            elem_type = ParamType(struct.unpack_from('>B', data, offset + 2)[0])
+            arr_len, raw_elem = ARRAY_HEAD_CODEC.unpack_from(data, offset)
+            elem_type = ParamType(raw_elem)
+            current = offset + ARRAY_HEAD_CODEC.size
+            
+            # 定长元素整块解码
+            typecode = self.ARRAY_TYPECODE.get(elem_type)
+            if typecode is not None:
+                end = current + arr_len * self.TYPE_CODEC[elem_type].size
+                if end > len(data):
+                    raise struct.error(f"数组数据越界: 需要 {end} 字节，实际 {len(data)} 字节")
+                arr = array(typecode)
+                arr.frombytes(data[current:end])
+                if sys.byteorder == 'little':
+                    arr.byteswap()
+                return arr.tolist(), end - offset
+            
             values = []
-            current = offset + 3
             for _ in range(arr_len):
                 val, size = self._read_value(data, current, elem_type)
                 values.append(val)
@@ -197,10 +377,10 @@ class BinParser:
         
         return None, 0
     
-    def _build_header(self) -> bytes:
-        """构建文件头部"""
-        header = struct.pack(
-            '>5sBHII16s',
+    def _build_header_into(self, buf: bytearray) -> None:
+        """把文件头部写入缓冲区开头"""
+        HEADER_CODEC.pack_into(
+            buf, 0,
             b'ELBIN',
             self.header.version if self.header else 1,
             len(self.params),
@@ -208,49 +388,87 @@ class BinParser:
             self.header.timestamp if self.header else 0,
             b'\x00' * 16
         )
-        return header
     
-    def _build_param(self, param: ParamEntry) -> bytes:
-        """构建单个参数的字节数据"""
-        # 参数ID和类型
-        data = struct.pack('>HB', param.id, param.type)
+    def _write_param(self, buf: bytearray, offset: int, param: ParamEntry,
+                     name_bytes: bytes) -> int:
+        """把单个参数写入缓冲区，返回写入后的偏移"""
+        # 参数ID、类型和名称长度
+        PARAM_HEAD_CODEC.pack_into(buf, offset, param.id, param.type, len(name_bytes))
+        offset += PARAM_HEAD_CODEC.size
         
         # 名称
-        name_bytes = param.name.encode('utf-8')
-        data += struct.pack('>B', len(name_bytes))
-        data += name_bytes
+        buf[offset:offset + len(name_bytes)] = name_bytes
+        offset += len(name_bytes)
         
         # 值
-        data += self._build_value(param.value, param.type)
+        return self._write_value(buf, offset, param.value, param.type, param.elem_type)
+    
+    def _value_size(self, value: Any, param_type: ParamType,
+                    elem_type: Optional[ParamType] = None) -> int:
+        """计算参数值编码后的字节数"""
+        codec = self.TYPE_CODEC.get(param_type)
+        if codec is not None:
+            return codec.size
+        elif param_type == ParamType.STRING:
+            return STR_LEN_CODEC.size + len(value.encode('utf-8'))
+        elif param_type == ParamType.ARRAY:
+            elem_type = elem_type or ParamType.FLOAT32
+            elem_codec = self.TYPE_CODEC.get(elem_type)
+            if elem_codec is not None:
+                return ARRAY_HEAD_CODEC.size + len(value or ()) * elem_codec.size
+            return ARRAY_HEAD_CODEC.size + sum(self._value_size(v, elem_type) for v in value or ())
         
-        return data
+        return 0
     
-    def _build_value(self, value: Any, param_type: ParamType) -> bytes:
+    def _build_value(self, value: Any, param_type: ParamType,
+                     elem_type: Optional[ParamType] = None) -> bytes:
         """构建参数值的字节数据"""
-        if param_type in self.TYPE_FORMAT:
-            fmt = '>' + self.TYPE_FORMAT[param_type]
-            return struct.pack(fmt, value)
+        buf = bytearray(self._value_size(value, param_type, elem_type))
+        self._write_value(buf, 0, value, param_type, elem_type)
+        return bytes(buf)
+    
+    def _write_value(self, buf: bytearray, offset: int, value: Any, param_type: ParamType,
+                     elem_type: Optional[ParamType] = None) -> int:
+        """把参数值写入缓冲区，返回写入后的偏移"""
+        codec = self.TYPE_CODEC.get(param_type)
+        if codec is not None:
+            codec.pack_into(buf, offset, value)
+            return offset + codec.size
         elif param_type == ParamType.STRING:
             str_bytes = value.encode('utf-8')
-            return struct.pack('>H', len(str_bytes)) + str_bytes
+            STR_LEN_CODEC.pack_into(buf, offset, len(str_bytes))
+            offset += STR_LEN_CODEC.size
+            buf[offset:offset + len(str_bytes)] = str_bytes
+            return offset + len(str_bytes)
         elif param_type == ParamType.ARRAY:
+            # 假设数组元素类型一致，未知时默认float
+            elem_type = elem_type or ParamType.FLOAT32
+            value = value or []
+            ARRAY_HEAD_CODEC.pack_into(buf, offset, len(value), elem_type)
+            offset += ARRAY_HEAD_CODEC.size
             if not value:
-                return struct.pack('>HB', 0, ParamType.FLOAT32)
-            # 假设数组元素类型一致
-            elem_type = ParamType.FLOAT32  # 默认float
-            data = struct.pack('>HB', len(value), elem_type)
+                return offset
+            
+            # 定长元素一次 struct 打包（struct 内部缓存编译后的格式），
+            # 越界值与逐个打包时一样抛出 struct.error / OverflowError，而不是被 array 转成 inf
+            fmt = self.TYPE_FORMAT.get(elem_type)
+            if fmt is not None:
+                struct.pack_into(f'>{len(value)}{fmt}', buf, offset, *value)
+                return offset + len(value) * self.TYPE_CODEC[elem_type].size
+            
             for v in value:
-                data += self._build_value(v, elem_type)
-            return data
+                offset = self._write_value(buf, offset, v, elem_type)
+            return offset
         
-        return b''
+        return offset
     
     def _calculate_checksum(self, data: bytes) -> int:
         """计算校验和"""
-        checksum = 0
-        for byte in data:
-            checksum = (checksum + byte) & 0xFFFFFFFF
-        return checksum
+        return calculate_checksum(data)
+    
+    def verify(self, data: bytes) -> bool:
+        """校验bin文件数据的校验和（不做完整解析）"""
+        return verify_checksum(data)
     
     def _to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -263,13 +481,16 @@ class BinParser:
         }
         
         for param in self.params:
-            result["params"][param.name] = {
+            entry = {
                 "id": param.id,
                 "type": param.type.name,
                 "value": param.value,
                 "unit": param.unit,
                 "description": param.description
             }
+            if param.elem_type is not None:
+                entry["elem_type"] = param.elem_type.name
+            result["params"][param.name] = entry
         
         return result
     
@@ -287,26 +508,536 @@ class BinParser:
         params_data = data.get("params", {})
         
         for name, param_info in params_data.items():
+            elem_type = param_info.get("elem_type")
             param = ParamEntry(
                 id=param_info.get("id", 0),
                 type=ParamType[param_info.get("type", "FLOAT32")],
                 name=name,
                 value=param_info.get("value"),
                 unit=param_info.get("unit", ""),
-                description=param_info.get("description", "")
+                description=param_info.get("description", ""),
+                elem_type=ParamType[elem_type] if elem_type else None
             )
             self.params.append(param)
 
 
+class ParamTable:
+    """
+    紧凑的列式参数表
+    
+    ID/类型存放在 array 中，名称和值各一个列表，单位/描述稀疏存储，
+    另有 名称 -> 行号 索引。同名参数以最后一个值为准（位置保留首次出现），
+    与 BinParser._to_dict() 的结果一致。
+    """
+    
+    __slots__ = ('header', 'ids', 'types', 'elem_types', 'names', 'values',
+                 'units', 'descriptions', 'index')
+    
+    def __init__(self, header: Optional[BinHeader] = None):
+        self.header = header
+        self.ids = array('H')
+        self.types = array('B')
+        self.elem_types = array('B')  # 0 表示非数组
+        self.names: List[str] = []
+        self.values: List[Any] = []
+        self.units: Dict[int, str] = {}
+        self.descriptions: Dict[int, str] = {}
+        self.index: Dict[str, int] = {}
+    
+    def append(self, param_id: int, param_type: ParamType, name: str, value: Any,
+               elem_type: Optional[ParamType] = None, unit: str = "", description: str = "") -> None:
+        """追加一个参数（同名时覆盖原有行）"""
+        row = self.index.get(name)
+        if row is None:
+            row = len(self.names)
+            self.index[name] = row
+            self.ids.append(param_id)
+            self.types.append(param_type)
+            self.elem_types.append(elem_type or 0)
+            self.names.append(name)
+            self.values.append(value)
+        else:
+            self.ids[row] = param_id
+            self.types[row] = param_type
+            self.elem_types[row] = elem_type or 0
+            self.values[row] = value
+        
+        for column, text in ((self.units, unit), (self.descriptions, description)):
+            if text:
+                column[row] = text
+            else:
+                column.pop(row, None)
+    
+    def copy(self) -> 'ParamTable':
+        """复制参数表：各列和数组值复制，标量值共享（不可变，无需复制）"""
+        table = ParamTable(replace(self.header) if self.header else None)
+        table.ids = array('H', self.ids)
+        table.types = array('B', self.types)
+        table.elem_types = array('B', self.elem_types)
+        table.names = list(self.names)
+        table.values = [_copy_value(v) for v in self.values]
+        table.units = dict(self.units)
+        table.descriptions = dict(self.descriptions)
+        table.index = dict(self.index)
+        return table
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+    
+    def __iter__(self) -> Iterator[ParamEntry]:
+        return (self.entry(row) for row in range(len(self.names)))
+    
+    def get(self, name: str) -> Optional[ParamEntry]:
+        """按名称获取参数，不存在时返回 None"""
+        row = self.index.get(name)
+        return None if row is None else self.entry(row)
+    
+    def entry(self, row: int) -> ParamEntry:
+        """把指定行还原为 ParamEntry"""
+        elem_type = self.elem_types[row]
+        return ParamEntry(
+            id=self.ids[row],
+            type=ParamType(self.types[row]),
+            name=self.names[row],
+            value=self.values[row],
+            unit=self.units.get(row, ""),
+            description=self.descriptions.get(row, ""),
+            elem_type=ParamType(elem_type) if elem_type else None
+        )
+    
+    def param_dict(self, row: int) -> Dict[str, Any]:
+        """指定行的字典形式（与 BinParser._to_dict 中单个参数一致）"""
+        entry = {
+            "id": self.ids[row],
+            "type": ParamType(self.types[row]).name,
+            "value": self.values[row],
+            "unit": self.units.get(row, ""),
+            "description": self.descriptions.get(row, "")
+        }
+        elem_type = self.elem_types[row]
+        if elem_type:
+            entry["elem_type"] = ParamType(elem_type).name
+        return entry
+    
+    def header_dict(self) -> Dict[str, Any]:
+        """头部的字典形式"""
+        return {
+            "version": self.header.version if self.header else 1,
+            "timestamp": self.header.timestamp if self.header else 0
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为与 BinParser.parse() 相同结构的字典"""
+        return {
+            "header": self.header_dict(),
+            "params": {name: self.param_dict(row) for row, name in enumerate(self.names)}
+        }
+    
+    def iter_json(self) -> Iterator[str]:
+        """逐个参数生成 JSON 文本片段，不构建完整字典"""
+        yield '{"header": ' + json.dumps(self.header_dict()) + ', "params": {'
+        for row, name in enumerate(self.names):
+            prefix = ', ' if row else ''
+            yield prefix + json.dumps(name, ensure_ascii=False) + ': ' + \
+                json.dumps(self.param_dict(row), ensure_ascii=False)
+        yield '}}'
+    
+    def write_json(self, fp) -> None:
+        """把 JSON 流式写入文本文件对象"""
+        for chunk in self.iter_json():
+            fp.write(chunk)
+
+
+def _copy_value(value: Any) -> Any:
+    """复制参数值：只有数组（列表，可能嵌套）需要复制"""
+    if type(value) is list:
+        return [_copy_value(v) if type(v) is list else v for v in value]
+    return value
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    """从流中读取恰好 size 个字节（兼容 socket 等可能只返回部分数据的流）"""
+    data = stream.read(size)
+    if len(data) == size:
+        return data
+    
+    chunks = [data]
+    remaining = size - len(data)
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            raise EOFError(f"数据不完整: 需要 {size} 字节，实际只读到 {size - remaining} 字节")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+class LazyBinFile:
+    """
+    按需解码的bin文件
+    
+    构造时只扫描一遍，建立 名称/ID -> 条目偏移 的索引；
+    get()/get_by_id() 只解码被访问的参数。同名（同ID）参数以最后一个为准，
+    与 BinParser.parse 的结果一致。
+    
+    open(path, writable=True) 打开时可以反复 patch()，索引和校验和在两次
+    修改之间保留，不必每次重新扫描文件。
+    """
+    
+    def __init__(self, data: bytes):
+        self._data = data
+        self._mmap: Optional[mmap.mmap] = None
+        self._file = None
+        self._parser = BinParser()
+        self._cache: Dict[int, ParamEntry] = {}
+        self._build_index()
+    
+    def _build_index(self) -> None:
+        """扫描所有条目，建立 名称/ID -> 条目偏移 的索引"""
+        data = self._data
+        self.header = self._parser._parse_header(data, 0)
+        self.offsets: List[int] = []
+        self._by_name: Dict[str, int] = {}
+        self._by_id: Dict[int, int] = {}
+        
+        offset = HEADER_CODEC.size
+        for _ in range(self.header.param_count):
+            param_id, name, size = self._parser._scan_param(data, offset)
+            self.offsets.append(offset)
+            self._by_name[name] = offset
+            self._by_id[param_id] = offset
+            offset += size
+    
+    @classmethod
+    def open(cls, filepath: str, writable: bool = False) -> 'LazyBinFile':
+        """
+        内存映射打开bin文件，用完需 close()（或使用 with 语句）
+        
+        writable=True 时以读写方式映射，可以调用 patch()
+        """
+        f = open(filepath, 'r+b' if writable else 'rb')
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+        view = memoryview(mm)
+        try:
+            lazy = cls(view)
+        except Exception:
+            view.release()
+            mm.close()
+            f.close()
+            raise
+        lazy._mmap = mm
+        if writable:
+            lazy._file = f
+        else:
+            f.close()
+        return lazy
+    
+    def close(self) -> None:
+        """释放内存映射（可写方式打开时先把修改写回磁盘）"""
+        if self._mmap is not None:
+            self._data.release()
+            if self._file is not None:
+                self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def patch(self, updates: Dict[str, Any]) -> None:
+        """
+        修改参数值，并增量更新校验和（需以 writable=True 打开）
+        
+        定长值原地写入映射；某个值的编码长度变化时，从第一个变长位置开始
+        重写文件尾部，然后重新映射并重建索引。
+        
+        Args:
+            updates: {参数名: 新值}，参数类型沿用文件中的定义
+        """
+        if self._file is None:
+            raise ValueError("文件未以可写方式打开: LazyBinFile.open(path, writable=True)")
+        
+        checksum, edits = _plan_patch(self, updates)
+        view = self._data
+        for name in updates:
+            self._cache.pop(self._by_name[name], None)
+        
+        # 第一个长度变化的修改之前的部分可以原地写入
+        split = next(
+            (i for i, (_, old_size, new_bytes) in enumerate(edits) if len(new_bytes) != old_size),
+            len(edits)
+        )
+        for value_offset, old_size, new_bytes in edits[:split]:
+            view[value_offset:value_offset + old_size] = new_bytes
+        CHECKSUM_CODEC.pack_into(view, CHECKSUM_OFFSET, checksum)
+        self.header = replace(self.header, checksum=checksum)
+        if split == len(edits):
+            return
+        
+        # 其余部分拼出新的文件尾部
+        tail_start = pos = edits[split][0]
+        pieces = []
+        for value_offset, old_size, new_bytes in edits[split:]:
+            pieces.append(view[pos:value_offset].tobytes())
+            pieces.append(new_bytes)
+            pos = value_offset + old_size
+        pieces.append(view[pos:].tobytes())
+        
+        view.release()
+        self._mmap.close()
+        f = self._file
+        f.seek(tail_start)
+        f.write(b''.join(pieces))
+        f.truncate()
+        f.flush()
+        self._mmap = mmap.mmap(f.fileno(), 0)
+        self._data = memoryview(self._mmap)
+        self._cache.clear()
+        self._build_index()
+    
+    def __enter__(self) -> 'LazyBinFile':
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    def __len__(self) -> int:
+        return len(self._by_name)
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+    
+    def names(self) -> List[str]:
+        """所有参数名称（按文件中最后出现的顺序去重）"""
+        return list(self._by_name)
+    
+    def get(self, name: str) -> Optional[ParamEntry]:
+        """按名称获取参数，不存在时返回 None"""
+        offset = self._by_name.get(name)
+        return None if offset is None else self._entry_at(offset)
+    
+    def get_by_id(self, param_id: int) -> Optional[ParamEntry]:
+        """按ID获取参数，不存在时返回 None"""
+        offset = self._by_id.get(param_id)
+        return None if offset is None else self._entry_at(offset)
+    
+    def _entry_at(self, offset: int) -> ParamEntry:
+        """解码指定偏移处的参数（结果缓存）"""
+        param = self._cache.get(offset)
+        if param is None:
+            param, _ = self._parser._parse_param(self._data, offset)
+            self._cache[offset] = param
+        return param
+
+
 # ============ 便捷函数 ============
 
-def parse_bin_file(filepath: str) -> Dict[str, Any]:
-    """解析bin文件"""
-    with open(filepath, 'rb') as f:
-        data = f.read()
+class ParseCache:
+    """
+    parse_bin_file 的 LRU 缓存（按需启用）
+    
+    默认以 (路径, 文件大小, mtime_ns) 识别文件；by_content=True 时改用
+    文件内容的 sha256（仍需读文件，但省去解码）。命中时返回缓存结果的
+    副本（只复制字典、列表和参数表的列，标量值共享），调用方可以随意
+    修改而不影响缓存；未命中时调用方拿到刚解析的结果，缓存保存其副本。
+    线程安全。
+    
+    用法：
+        cache = ParseCache(maxsize=64)
+        result = parse_bin_file(path, cache=cache)
+    """
+    
+    def __init__(self, maxsize: int = 32, by_content: bool = False):
+        self.maxsize = maxsize
+        self.by_content = by_content
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[tuple, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def parse(self, filepath: str, use_mmap: bool = False, compact: bool = False):
+        """带缓存的 parse_bin_file"""
+        key = self._key(filepath, compact)
+        
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            return self._copy(cached)
+        
+        result = parse_bin_file(filepath, use_mmap=use_mmap, compact=compact)
+        with self._lock:
+            self._entries[key] = self._copy(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+    
+    @staticmethod
+    def _copy(result: Any) -> Any:
+        """复制解析结果（比 deepcopy 快得多：值只可能是标量、字符串或列表）"""
+        if isinstance(result, ParamTable):
+            return result.copy()
+        return {
+            "header": dict(result["header"]),
+            "params": {
+                name: {**entry, "value": _copy_value(entry["value"])}
+                for name, entry in result["params"].items()
+            }
+        }
+    
+    def _key(self, filepath: str, compact: bool) -> tuple:
+        """计算文件的缓存键"""
+        if self.by_content:
+            digest = hashlib.sha256()
+            with open(filepath, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            return (digest.hexdigest(), compact)
+        
+        st = os.stat(filepath)
+        return (os.path.abspath(filepath), st.st_size, st.st_mtime_ns, compact)
+    
+    def info(self) -> Dict[str, int]:
+        """命中/未命中统计"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize
+            }
+    
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def parse_bin_file(filepath: str, use_mmap: bool = False, compact: bool = False,
+                   cache: Optional[ParseCache] = None):
+    """
+    解析bin文件
+    
+    Args:
+        filepath: bin文件路径
+        use_mmap: 为 True 时内存映射文件并通过 memoryview 零拷贝解析，
+                  额外内存占用与文件大小基本无关，适合批量处理大文件
+        compact: 为 True 时返回 ParamTable（列式存储，字典按需生成），
+                 否则返回参数字典
+        cache: 可选的 ParseCache，文件未变化时直接返回缓存结果的副本
+    """
+    if cache is not None:
+        return cache.parse(filepath, use_mmap=use_mmap, compact=compact)
     
     parser = BinParser()
-    return parser.parse(data)
+    parse = parser.parse_table if compact else parser.parse
+    
+    with open(filepath, 'rb') as f:
+        if not use_mmap:
+            return parse(f.read())
+        return _parse_mapped(parse, f)
+
+
+def _parse_mapped(parse, f):
+    """通过 mmap + memoryview 解析已打开的文件"""
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # 空文件无法映射，按普通方式解析（会给出与原来一致的错误）
+        return parse(b'')
+    
+    with mm, memoryview(mm) as view:
+        return parse(view)
+
+
+def verify_bin_file(filepath: str) -> bool:
+    """校验bin文件的校验和（内存映射读取，不做完整解析）"""
+    with open(filepath, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return False
+        with mm, memoryview(mm) as view:
+            return verify_checksum(view)
+
+
+def _plan_patch(index: LazyBinFile, updates: Dict[str, Any]) -> Tuple[int, List[Tuple[int, int, bytes]]]:
+    """
+    计算参数补丁（不修改数据）
+    
+    Returns:
+        (新校验和, [(值偏移, 原值字节数, 新值字节), ...])，按偏移升序
+    """
+    data = index._data
+    parser = index._parser
+    checksum = index.header.checksum
+    edits = []
+    
+    for name, value in updates.items():
+        offset = index._by_name.get(name)
+        if offset is None:
+            raise KeyError(f"参数不存在: {name}")
+        
+        # 沿用文件中的类型（数组沿用元素类型）编码新值
+        _, raw_type, name_len = PARAM_HEAD_CODEC.unpack_from(data, offset)
+        param_type = ParamType(raw_type)
+        value_offset = offset + PARAM_HEAD_CODEC.size + name_len
+        old_size = parser._value_span(data, value_offset, param_type)
+        elem_type = ParamType(data[value_offset + 2]) if param_type == ParamType.ARRAY else None
+        new_bytes = parser._build_value(value, param_type, elem_type)
+        
+        checksum = update_checksum(checksum, data[value_offset:value_offset + old_size], new_bytes)
+        edits.append((value_offset, old_size, new_bytes))
+    
+    edits.sort()
+    return checksum, edits
+
+
+def patch_bin_data(data: bytearray, updates: Dict[str, Any]) -> None:
+    """
+    原地修改bin数据中的参数值，并增量更新校验和
+    
+    Args:
+        data: bin文件数据（会被直接修改）
+        updates: {参数名: 新值}，参数类型沿用文件中的定义
+    """
+    checksum, edits = _plan_patch(LazyBinFile(data), updates)
+    # 从后往前替换，长度变化不影响前面的偏移
+    for value_offset, old_size, new_bytes in reversed(edits):
+        data[value_offset:value_offset + old_size] = new_bytes
+    CHECKSUM_CODEC.pack_into(data, CHECKSUM_OFFSET, checksum)
+
+
+def patch_bin_file(filepath: str, updates: Dict[str, Any]) -> None:
+    """
+    直接修改bin文件中的参数值，不做完整解析/重建
+    
+    定长值通过内存映射原地写入，并增量更新校验和；只有当某个值的
+    编码长度发生变化时，才从第一个变长位置开始重写文件尾部。
+    单位、范围等元数据不经过字典转换，不会丢失。
+    同一文件要多次修改时，用 LazyBinFile.open(path, writable=True)
+    保持打开并反复 patch()，省去每次扫描建索引。
+    
+    Args:
+        filepath: bin文件路径
+        updates: {参数名: 新值}，参数类型沿用文件中的定义
+    """
+    with LazyBinFile.open(filepath, writable=True) as lazy:
+        lazy.patch(updates)
 
 
 def save_bin_file(filepath: str, params: Dict[str, Any]) -> None:
@@ -318,8 +1049,18 @@ def save_bin_file(filepath: str, params: Dict[str, Any]) -> None:
         f.write(data)
 
 
-def bin_to_json(bin_path: str, json_path: str) -> None:
-    """将bin文件转换为JSON"""
+def bin_to_json(bin_path: str, json_path: str, compact: bool = False) -> None:
+    """
+    将bin文件转换为JSON
+    
+    compact=True 时通过 ParamTable 逐个参数写出（无缩进），不构建完整字典
+    """
+    if compact:
+        table = parse_bin_file(bin_path, compact=True)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            table.write_json(f)
+        return
+    
     params = parse_bin_file(bin_path)
     with open(json_path, 'w', encoding='utf-8') as f:
         json.dump(params, f, indent=2, ensure_ascii=False)
@@ -334,14 +1075,13 @@ def json_to_bin(json_path: str, bin_path: str) -> None:
 
 if __name__ == "__main__":
     # 测试代码
-    import sys
-    
     if len(sys.argv) < 2:
         print("用法: python bin_parser.py <命令> [参数...]")
         print("命令:")
         print("  parse <bin文件>              - 解析bin文件并输出JSON")
         print("  convert <bin文件> <json文件> - 将bin转换为JSON")
         print("  build <json文件> <bin文件>   - 将JSON转换为bin")
+        print("  verify <bin文件>             - 校验bin文件的校验和")
         sys.exit(1)
     
     cmd = sys.argv[1]
@@ -355,6 +1095,10 @@ if __name__ == "__main__":
     elif cmd == "build" and len(sys.argv) > 3:
         json_to_bin(sys.argv[2], sys.argv[3])
         print(f"已构建: {sys.argv[2]} -> {sys.argv[3]}")
+    elif cmd == "verify" and len(sys.argv) > 2:
+        ok = verify_bin_file(sys.argv[2])
+        print("校验通过" if ok else "校验失败")
+        sys.exit(0 if ok else 1)
     else:
         print("参数错误")
 
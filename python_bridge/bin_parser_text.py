@@ -9,13 +9,28 @@
 - param:value：单值
 - param:1 2 3：数组
 - param: 后续缩进行：矩阵（二维数组）
+
+parse_text_bin(..., typed=True) 时，同类数值的数组/矩阵行以 array 存放
+（全整数 'q'，全浮点 'd'），build_text_bin 可直接使用。服务端的 JSON 输出
+（fastapi_server 的 _dumps_json）和 to_columnar 直接写出 array，不转回 list；
+用标准库 json.dumps 时需传 default=json_default，此时会临时转成 list。
 """
 
 from __future__ import annotations
 
+import base64
+import hashlib
+import io
+import os
 import re
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional, Tuple, Union
+from difflib import SequenceMatcher
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 
 
 Number = Union[int, float]
@@ -28,22 +43,194 @@ class ParseMsg:
     type: str  # "error" | "warning"
 
 
+_INT_RE = re.compile(r"-?\d+")
+_FLOAT_RE = re.compile(r"-?\d+\.\d*|-?\d*\.\d+|-?\d+\.")
+
+# 只含这些字符的行可以直接交给 int()/float()：
+# 此时 int()/float() 成功与否和上面两个正则完全等价（排除了 "+1"、"1e5"、"1_0"、"inf" 等写法）
+_NUMERIC_ROW_CHARS = frozenset("0123456789.- \t")
+
+
 def _parse_value(token: str) -> Any:
     t = token.strip()
-    if re.fullmatch(r"-?\d+", t):
+    if _INT_RE.fullmatch(t):
         return int(t, 10)
-    if re.fullmatch(r"-?\d+\.\d*|-?\d*\.\d+|-?\d+\.", t):
+    if _FLOAT_RE.fullmatch(t):
         return float(t)
-    if t.lower() == "true":
+    low = t.lower()
+    if low == "true":
         return True
-    if t.lower() == "false":
+    if low == "false":
         return False
     return t
 
 
-def parse_text_bin(content: str, filename: str = "unknown") -> Dict[str, Any]:
-    errors: List[ParseMsg] = []
-    warnings: List[ParseMsg] = []
+def _parse_row(text: str) -> List[Any]:
+    """
+    解析一行空白分隔的值（数组 / 矩阵行），结果与逐个 _parse_value 相同
+
+    纯数字行一次遍历直接转换；遇到其他字符或转换失败时退回逐个解析
+    """
+    parts = text.split()
+    if _NUMERIC_ROW_CHARS.issuperset(text):
+        try:
+            return [float(v) if "." in v else int(v, 10) for v in parts]
+        except ValueError:
+            pass
+    return [_parse_value(v) for v in parts]
+
+
+def _to_typed(values: List[Any]) -> Any:
+    """同类数值列表转为 array（全 int -> 'q'，全 float -> 'd'），否则原样返回"""
+    if not values:
+        return values
+    kinds = set(map(type, values))
+    if kinds == {float}:
+        return array("d", values)
+    if kinds == {int}:
+        try:
+            return array("q", values)
+        except OverflowError:
+            return values
+    return values
+
+
+def _to_typed_matrix(rows: List[List[Any]]) -> List[Any]:
+    """所有行都是同一种数值类型时，每行转为 array；否则原样返回"""
+    typed = [_to_typed(r) for r in rows]
+    codes = {getattr(r, "typecode", None) for r in typed}
+    if len(codes) == 1 and None not in codes:
+        return typed
+    return rows
+
+
+def json_default(obj: Any) -> Any:
+    """
+    标准库 json.dumps 的 default 钩子：把 array 转为 list 输出
+
+    标准库 json 的编码器只认 list/tuple，这里会为每个 array 临时建一个
+    list；服务端的 _dumps_json 不经过这里，直接写出 array
+    """
+    if isinstance(obj, array):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class _TextBinReader:
+    """
+    逐行解析文本 bin 的状态机
+
+    feed() 读到新的模块名时交出上一个已完成的模块，close() 交出最后一个；
+    交出的模块带有 "errors"/"warnings"（只含该模块范围内的消息）。
+    第一个模块之前的错误以 name 为 None 的记录交出。
+    """
+
+    def __init__(self, typed: bool = False):
+        self.typed = typed
+        self.module: Optional[Dict[str, Any]] = None
+        self.seen_module = False
+        self.errors: List[ParseMsg] = []
+        self.warnings: List[ParseMsg] = []
+        self.pending_multiline: Optional[Tuple[str, int]] = None  # (param_name, line_num)
+        self.multiline_rows: List[List[Any]] = []
+        # 当前模块的 参数名 -> params 下标；重复定义时旧条目先置为 None，模块结束时统一清理
+        self.param_index: Dict[str, int] = {}
+        self.has_holes = False
+
+    def feed(self, line_num: int, raw_line: str) -> Optional[Dict[str, Any]]:
+        line = raw_line.strip()
+
+        # multiline block
+        if self.pending_multiline is not None:
+            if raw_line.startswith("    ") or raw_line.startswith("\t"):
+                row = _parse_row(line) if line else []
+                if row:
+                    self.multiline_rows.append(row)
+                return None
+            else:
+                self._flush_multiline()
+
+        if not line or line.startswith("#") or line.upper() == "END":
+            return None
+
+        if ":" not in line:
+            # module line
+            done = self._finish()
+            self.module = {"name": line, "params": [], "lineNum": line_num}
+            self.seen_module = True
+            return done
+
+        colon = line.find(":")
+        key = line[:colon].strip()
+        val = line[colon + 1 :].strip()
+
+        if not key:
+            self.errors.append(ParseMsg(line_num, "参数名不能为空", "error"))
+            return None
+        if self.module is None:
+            self.errors.append(ParseMsg(line_num, f'参数 "{key}" 没有所属模块，请先定义模块名', "error"))
+            return None
+
+        # duplicated param -> keep last, warn
+        old = self.param_index.pop(key, None)
+        if old is not None:
+            self.warnings.append(ParseMsg(line_num, f'模块 "{self.module["name"]}" 中参数 "{key}" 重复定义，将使用最后一个值', "warning"))
+            self.module["params"][old] = None
+            self.has_holes = True
+
+        if val == "":
+            self.pending_multiline = (key, line_num)
+            self.multiline_rows = []
+        elif " " in val:
+            arr = _parse_row(val)
+            self._add_param({"name": key, "value": _to_typed(arr) if self.typed else arr, "type": "array", "lineNum": line_num})
+        else:
+            self._add_param({"name": key, "value": _parse_value(val), "type": "single", "lineNum": line_num})
+        return None
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        # file end multiline
+        self._flush_multiline()
+        if not self.seen_module:
+            self.errors.append(ParseMsg(0, "文件中没有找到任何模块定义", "error"))
+        return self._finish()
+
+    def _add_param(self, entry: Dict[str, Any]) -> None:
+        params = self.module["params"]
+        self.param_index[entry["name"]] = len(params)
+        params.append(entry)
+
+    def _flush_multiline(self) -> None:
+        if self.pending_multiline and self.module is not None:
+            name, ln = self.pending_multiline
+            rows = _to_typed_matrix(self.multiline_rows) if self.typed else self.multiline_rows
+            self._add_param({"name": name, "value": rows, "type": "matrix", "lineNum": ln})
+        self.pending_multiline = None
+        self.multiline_rows = []
+
+    def _finish(self) -> Optional[Dict[str, Any]]:
+        """结束当前模块（或第一个模块之前的部分），附上该范围内的错误/警告"""
+        mod = self.module
+        if mod is None:
+            if not self.errors and not self.warnings:
+                return None
+            mod = {"name": None, "params": [], "lineNum": 0}
+        elif self.has_holes:
+            mod["params"] = [p for p in mod["params"] if p is not None]
+        mod["errors"] = [asdict(x) for x in self.errors]
+        mod["warnings"] = [asdict(x) for x in self.warnings]
+
+        self.module = None
+        self.errors = []
+        self.warnings = []
+        self.param_index = {}
+        self.has_holes = False
+        return mod
+
+
+def parse_text_bin(content: str, filename: str = "unknown", typed: bool = False) -> Dict[str, Any]:
+    errors: List[Dict[str, Any]] = []
+    warnings: List[Dict[str, Any]] = []
 
     result: Dict[str, Any] = {
         "success": True,
@@ -55,98 +242,815 @@ def parse_text_bin(content: str, filename: str = "unknown") -> Dict[str, Any]:
     }
 
     if not isinstance(content, str) or not content:
-        errors.append(ParseMsg(0, "文件内容为空或格式无效", "error"))
-        result["errors"] = [asdict(x) for x in errors]
-        result["warnings"] = [asdict(x) for x in warnings]
+        result["errors"] = [asdict(ParseMsg(0, "文件内容为空或格式无效", "error"))]
         result["success"] = False
         return result
 
-    lines = content.splitlines()
-    current_module: Optional[Dict[str, Any]] = None
-    pending_multiline: Optional[Tuple[str, int]] = None  # (param_name, line_num)
-    multiline_rows: List[List[Any]] = []
-
-    def flush_multiline():
-        nonlocal pending_multiline, multiline_rows, current_module
-        if pending_multiline and current_module is not None:
-            name, ln = pending_multiline
-            current_module["params"].append(
-                {"name": name, "value": multiline_rows, "type": "matrix", "lineNum": ln}
-            )
-        pending_multiline = None
-        multiline_rows = []
-
-    for idx, raw_line in enumerate(lines):
+    def collect(mod: Optional[Dict[str, Any]]):
+        if mod is None:
+            return
+        errors.extend(mod.pop("errors"))
+        warnings.extend(mod.pop("warnings"))
+        if mod["name"] is not None:
+            result["modules"].append(mod)
+
+    reader = _TextBinReader(typed)
+    for idx, raw_line in enumerate(content.splitlines()):
+        collect(reader.feed(idx + 1, raw_line))
+    collect(reader.close())
+
+    result["errors"] = errors
+    result["warnings"] = warnings
+    result["success"] = len(errors) == 0
+    return result
+
+
+def iter_text_bin_modules(stream: Iterable[Union[str, bytes]], typed: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    流式解析文本 bin：逐行读取文件对象，每读完一个模块就产出该模块
+
+    产出的模块结构与 parse_text_bin 的 modules 元素相同，另外带有
+    "errors"/"warnings"（该模块范围内的消息）。第一个模块之前的错误
+    （以及“没有任何模块”“内容为空”）以 name 为 None 的记录产出。
+    内存占用只与最大的单个模块有关；不回显原文 raw。
+
+    Args:
+        stream: 文本或二进制文件对象（二进制按 utf-8 解码，无法解码的字节替换）
+        typed: 同 parse_text_bin
+    """
+    reader = _TextBinReader(typed)
+    line_num = 0
+    for chunk in stream:
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode("utf-8", errors="replace")
+        # 与 str.splitlines() 的分行规则保持一致
+        for raw_line in chunk.splitlines():
+            line_num += 1
+            mod = reader.feed(line_num, raw_line)
+            if mod is not None:
+                yield mod
+
+    if line_num == 0:
+        yield {
+            "name": None,
+            "params": [],
+            "lineNum": 0,
+            "errors": [asdict(ParseMsg(0, "文件内容为空或格式无效", "error"))],
+            "warnings": [],
+        }
+        return
+
+    mod = reader.close()
+    if mod is not None:
+        yield mod
+
+
+def _changed_span(old_lines: List[str], new_lines: List[str]) -> Tuple[int, int, int]:
+    """比较公共前缀/后缀，返回 (首个变化行下标, 旧文本变化结束下标, 新文本变化结束下标)"""
+    limit = min(len(old_lines), len(new_lines))
+    first = 0
+    while first < limit and old_lines[first] == new_lines[first]:
+        first += 1
+    tail = 0
+    while tail < limit - first and old_lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+    return first, len(old_lines) - tail, len(new_lines) - tail
+
+
+def _hinted_span(
+    old_lines: List[str], new_lines: List[str], edits: List[Tuple[int, int, int]]
+) -> Optional[Tuple[int, int, int]]:
+    """
+    由编辑范围得到 (首个变化行下标, 旧文本变化结束下标, 新文本变化结束下标)
+
+    范围之外的前缀/后缀必须与旧文本逐行相同，否则（提示有误）返回 None
+    """
+    if edits:
+        first = min(start for start, _, _ in edits) - 1
+        old_end = max(start - 1 + removed for start, removed, _ in edits)
+        new_end = old_end + sum(added - removed for _, removed, added in edits)
+    else:
+        first = old_end = new_end = len(new_lines)
+    if not (0 <= first <= old_end <= len(old_lines) and first <= new_end <= len(new_lines)):
+        return None
+    if len(old_lines) - old_end != len(new_lines) - new_end:
+        return None
+    if old_lines[:first] != new_lines[:first] or old_lines[old_end:] != new_lines[new_end:]:
+        return None
+    return first, old_end, new_end
+
+
+def _shift_module(mod: Dict[str, Any], delta: int) -> Dict[str, Any]:
+    """复制模块并平移行号（参数值不复制）"""
+    if not delta:
+        return mod
+    params = [{**p, "lineNum": p["lineNum"] + delta} for p in mod["params"]]
+    return {**mod, "params": params, "lineNum": mod["lineNum"] + delta}
+
+
+def reparse_text_bin(
+    prev: Dict[str, Any],
+    content: str,
+    edits: Optional[List[Tuple[int, int, int]]] = None,
+    filename: Optional[str] = None,
+    typed: bool = False,
+) -> Dict[str, Any]:
+    """
+    增量重新解析：只重新解析受影响的模块，其余模块平移行号后复用
+
+    结果与 parse_text_bin(content, filename, typed) 完全相同。
+
+    Args:
+        prev: 上一次 parse_text_bin（或本函数）的结果，需要带 raw
+        content: 编辑后的完整文本
+        edits: 可选的编辑范围 [(起始行, 删除行数, 插入行数), ...]，行号从 1 开始、
+               基于旧文本且互不重叠；不传或与实际内容对不上时通过比较
+               prev["raw"] 与 content 得到
+        filename: 默认沿用 prev["filename"]
+        typed: 需与生成 prev 时一致
+    """
+    if filename is None:
+        filename = prev.get("filename", "unknown")
+    old_raw = prev.get("raw")
+    old_mods = prev.get("modules") or []
+    if not isinstance(content, str) or not content or not isinstance(old_raw, str) or not old_mods:
+        return parse_text_bin(content, filename, typed)
+
+    new_lines = content.splitlines()
+    old_lines = old_raw.splitlines()
+    span = _hinted_span(old_lines, new_lines, edits) if edits is not None else None
+    first, old_end, new_end = span if span is not None else _changed_span(old_lines, new_lines)
+    delta = new_end - old_end
+
+    # 从“首个变化行的前一行”所在模块的模块名行开始重新解析；变化在第一个模块之前则从头开始
+    headers = [m["lineNum"] for m in old_mods]
+    keep = max(bisect_right(headers, first) - 1, 0)
+    start_line = headers[keep] if keep else 1
+
+    errors = [e for e in prev.get("errors") or [] if e["lineNum"] < start_line]
+    warnings = [w for w in prev.get("warnings") or [] if w["lineNum"] < start_line]
+    modules = old_mods[:keep]
+
+    def collect(mod: Optional[Dict[str, Any]]):
+        if mod is None:
+            return
+        errors.extend(mod.pop("errors"))
+        warnings.extend(mod.pop("warnings"))
+        if mod["name"] is not None:
+            modules.append(mod)
+
+    # 重新解析，直到在未变化的尾部遇到一个旧模块的模块名行
+    reader = _TextBinReader(typed)
+    resync = None
+    for idx in range(start_line - 1, len(new_lines)):
         line_num = idx + 1
-        line = raw_line.strip()
+        done = reader.feed(line_num, new_lines[idx])
+        collect(done)
+        if idx >= new_end and reader.module is not None and reader.module["lineNum"] == line_num:
+            j = bisect_right(headers, line_num - delta) - 1
+            if j >= 0 and headers[j] == line_num - delta:
+                resync = j
+                break
+    if resync is None:
+        collect(reader.close())
+    else:
+        sync_line = headers[resync]
+        modules.extend(_shift_module(m, delta) for m in old_mods[resync:])
+        errors.extend({**e, "lineNum": e["lineNum"] + delta} for e in prev.get("errors") or [] if e["lineNum"] >= sync_line)
+        warnings.extend({**w, "lineNum": w["lineNum"] + delta} for w in prev.get("warnings") or [] if w["lineNum"] >= sync_line)
 
-        # multiline block
-        if pending_multiline is not None:
-            if raw_line.startswith("    ") or raw_line.startswith("\t"):
-                row = [ _parse_value(v) for v in line.split() ] if line else []
-                if row:
-                    multiline_rows.append(row)
-                continue
-            else:
-                flush_multiline()
+    return {
+        "success": len(errors) == 0,
+        "filename": filename,
+        "modules": modules,
+        "errors": errors,
+        "warnings": warnings,
+        "raw": content,
+    }
 
-        if not line or line.startswith("#") or line.upper() == "END":
+
+class TextParseCache:
+    """
+    parse_text_bin 的 LRU 缓存，按文本内容的 sha256 识别（与文件名无关）
+
+    命中时不再解析；返回的结果与缓存共享 modules（顶层字典是新的，filename
+    按本次调用设置），调用方不要修改其中的模块和参数。
+    超过 max_chars 字符的文本不缓存；缓存的文本总字符数也不超过 max_chars。
+    线程安全。
+
+    用法：
+        cache = TextParseCache(maxsize=32)
+        result = cache.parse(content, filename)
+        result = cache.parse_file(path)       # 读取文件，内容未变时不再解析
+    """
+
+    def __init__(self, maxsize: int = 32, max_chars: int = 1 << 26):
+        self.maxsize = maxsize
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, bool], Dict[str, Any]]" = OrderedDict()
+        self._chars = 0
+        # 文件路径 -> ((大小, mtime_ns), 内容摘要)
+        self._stamps: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def parse(self, content: str, filename: str = "unknown", typed: bool = False) -> Dict[str, Any]:
+        """带缓存的 parse_text_bin"""
+        if not isinstance(content, str):
+            return parse_text_bin(content, filename, typed)
+        key = (self.digest(content), typed)
+        cached = self._lookup(key)
+        if cached is None:
+            cached = parse_text_bin(content, filename, typed)
+            self._store(key, cached)
+        return {**cached, "filename": filename}
+
+    def parse_file(
+        self, filepath: Any, filename: Optional[str] = None, typed: bool = False, trust_mtime: bool = False
+    ) -> Dict[str, Any]:
+        """
+        读取并解析文本 bin 文件（utf-8，无法解码的字节替换）
+
+        默认每次都读取文件并按内容摘要查缓存。trust_mtime=True 时，文件大小和
+        mtime_ns 与上次相同且结果仍在缓存中则不读取文件；同一时间戳内被改写
+        （或 mtime 被还原）的文件会返回旧结果，只在能接受这一点时使用。
+        """
+        path = os.path.abspath(filepath)
+        if filename is None:
+            filename = os.path.basename(path)
+        stamp = None
+        if trust_mtime:
+            st = os.stat(path)
+            stamp = (st.st_size, st.st_mtime_ns)
+            with self._lock:
+                known = self._stamps.get(path)
+            if known is not None and known[0] == stamp:
+                # 未命中不计数，下面读取文件后的查找再计
+                cached = self._lookup((known[1], typed), count_miss=False)
+                if cached is not None:
+                    return {**cached, "filename": filename}
+
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            content = f.read()
+        digest = self.digest(content)
+        if stamp is not None:
+            with self._lock:
+                self._stamps[path] = (stamp, digest)
+                self._stamps.move_to_end(path)
+                while len(self._stamps) > self.maxsize * 4:
+                    self._stamps.popitem(last=False)
+        key = (digest, typed)
+        cached = self._lookup(key)
+        if cached is None:
+            cached = parse_text_bin(content, filename, typed)
+            self._store(key, cached)
+        return {**cached, "filename": filename}
+
+    def _lookup(self, key: Tuple[str, bool], count_miss: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            elif count_miss:
+                self.misses += 1
+            return cached
+
+    def _store(self, key: Tuple[str, bool], result: Dict[str, Any]) -> None:
+        size = len(result.get("raw") or "")
+        if size > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._chars -= len(old.get("raw") or "")
+            self._entries[key] = result
+            self._chars += size
+            while len(self._entries) > self.maxsize or self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted.get("raw") or "")
+
+    def info(self) -> Dict[str, int]:
+        """命中/未命中统计"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "chars": self._chars,
+            }
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        with self._lock:
+            self._entries.clear()
+            self._stamps.clear()
+            self._chars = 0
+            self.hits = 0
+            self.misses = 0
+
+
+_INT32_MIN, _INT32_MAX = -(1 << 31), (1 << 31) - 1
+
+
+def _pack_matrix(rows: List[Any]) -> Any:
+    """
+    数值矩阵打包为 base64（小端）：全浮点 "<f8"，全整数且在 int32 范围内 "<i4"；
+    其他情况原样返回。规则矩阵带 shape，不规则矩阵带 rowLengths。
+    """
+    if not rows:
+        return rows
+    kinds = set()
+    for row in rows:
+        if isinstance(row, array):
+            kinds.add(float if row.typecode == "d" else int)
+        else:
+            kinds.update(map(type, row))
+    if kinds == {float}:
+        dtype, code = "<f8", "d"
+    elif kinds == {int}:
+        dtype, code = "<i4", "i"
+        if array(code).itemsize != 4:
+            return rows
+        if min(map(min, (r for r in rows if len(r)))) < _INT32_MIN or max(map(max, (r for r in rows if len(r)))) > _INT32_MAX:
+            return rows
+    else:
+        return rows
+
+    flat = array(code)
+    for row in rows:
+        flat.extend(row if not isinstance(row, array) or row.typecode == code else array(code, row))
+    if sys.byteorder == "big":
+        flat.byteswap()
+
+    packed: Dict[str, Any] = {"dtype": dtype, "data": base64.b64encode(flat.tobytes()).decode("ascii")}
+    lengths = [len(r) for r in rows]
+    if len(set(lengths)) == 1:
+        packed["shape"] = [len(rows), lengths[0]]
+    else:
+        packed["rowLengths"] = lengths
+    return packed
+
+
+def _unpack_matrix(packed: Dict[str, Any]) -> List[List[Any]]:
+    """_pack_matrix 的逆操作"""
+    flat = array("d" if packed["dtype"] == "<f8" else "i")
+    flat.frombytes(base64.b64decode(packed["data"]))
+    if sys.byteorder == "big":
+        flat.byteswap()
+    if "shape" in packed:
+        lengths = [packed["shape"][1]] * packed["shape"][0]
+    else:
+        lengths = packed["rowLengths"]
+    rows, pos = [], 0
+    for n in lengths:
+        rows.append(flat[pos:pos + n].tolist())
+        pos += n
+    return rows
+
+
+def to_columnar(
+    result: Dict[str, Any],
+    raw: bool = False,
+    line_nums: bool = True,
+    pack_matrices: bool = True,
+) -> Dict[str, Any]:
+    """
+    把 parse_text_bin 的结果转为紧凑的列式结构（format="columnar"）
+
+    每个模块的参数按列存放：params = {"name": [...], "type": [...], "value": [...],
+    "lineNum": [...]}，不再为每个参数重复键名。
+
+    Args:
+        result: parse_text_bin 的结果
+        raw: 是否保留原文 raw
+        line_nums: 是否保留模块和参数的 lineNum（errors/warnings 始终带行号）
+        pack_matrices: 数值矩阵是否打包为 base64（见 _pack_matrix）
+    """
+    modules = []
+    for mod in result.get("modules") or []:
+        names, types, values, lines = [], [], [], []
+        for p in mod.get("params") or []:
+            value = p.get("value")
+            if pack_matrices and p.get("type") == "matrix":
+                value = _pack_matrix(value)
+            names.append(p.get("name"))
+            types.append(p.get("type"))
+            values.append(value)
+            lines.append(p.get("lineNum"))
+        params = {"name": names, "type": types, "value": values}
+        out_mod: Dict[str, Any] = {"name": mod.get("name"), "params": params}
+        if line_nums:
+            params["lineNum"] = lines
+            out_mod["lineNum"] = mod.get("lineNum")
+        modules.append(out_mod)
+
+    out = {
+        "format": "columnar",
+        "success": result.get("success"),
+        "filename": result.get("filename"),
+        "modules": modules,
+        "errors": result.get("errors") or [],
+        "warnings": result.get("warnings") or [],
+    }
+    if raw:
+        out["raw"] = result.get("raw")
+    return out
+
+
+def from_columnar(data: Dict[str, Any]) -> Dict[str, Any]:
+    """to_columnar 的逆操作（未保留的 raw/lineNum 分别还原为空串/0）"""
+    modules = []
+    for mod in data.get("modules") or []:
+        cols = mod.get("params") or {}
+        lines = cols.get("lineNum") or [0] * len(cols.get("name") or [])
+        params = []
+        for name, p_type, value, ln in zip(cols.get("name") or [], cols.get("type") or [], cols.get("value") or [], lines):
+            if p_type == "matrix" and isinstance(value, dict):
+                value = _unpack_matrix(value)
+            params.append({"name": name, "value": value, "type": p_type, "lineNum": ln})
+        modules.append({"name": mod.get("name"), "params": params, "lineNum": mod.get("lineNum", 0)})
+    return {
+        "success": data.get("success"),
+        "filename": data.get("filename"),
+        "modules": modules,
+        "errors": data.get("errors") or [],
+        "warnings": data.get("warnings") or [],
+        "raw": data.get("raw", ""),
+    }
+
+
+def _row_digest(row: Any) -> bytes:
+    """一行（数组 / 矩阵行）的摘要；同类数值行按 array 字节计算，typed 与否结果相同"""
+    if not isinstance(row, array):
+        row = _to_typed(row)
+    if isinstance(row, array) and len(row):
+        data = row.typecode.encode() + row.tobytes()
+    else:
+        data = repr(list(row)).encode()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _index_module(mod: Dict[str, Any]) -> Tuple[bytes, Dict[str, Tuple[Dict[str, Any], bytes, Optional[List[bytes]]]]]:
+    """
+    计算模块摘要和参数索引：参数名 -> (参数, 参数摘要, 矩阵行摘要)
+
+    模块摘要与参数顺序无关
+    """
+    params: Dict[str, Tuple[Dict[str, Any], bytes, Optional[List[bytes]]]] = {}
+    for p in mod.get("params") or []:
+        p_type = p.get("type")
+        value = p.get("value")
+        rows = None
+        if p_type == "matrix":
+            rows = [_row_digest(r) for r in value or []]
+            digest = hashlib.blake2b(b"".join(rows), digest_size=16, person=b"matrix").digest()
+        elif p_type == "array":
+            digest = _row_digest(value or [])
+        else:
+            digest = hashlib.blake2b(repr((type(value).__name__, value)).encode(), digest_size=16).digest()
+        params[p.get("name")] = (p, digest, rows)
+
+    h = hashlib.blake2b(digest_size=16)
+    for name in sorted(params):
+        h.update(name.encode())
+        h.update(b"\0")
+        h.update(params[name][1])
+    return h.digest(), params
+
+
+def _same_values(mod_a: Dict[str, Any], mod_b: Dict[str, Any]) -> bool:
+    """两个模块的参数值是否为同一批对象（如 reparse_text_bin 复用的模块），是则无需计算摘要"""
+    pa = mod_a.get("params") or []
+    pb = mod_b.get("params") or []
+    return len(pa) == len(pb) and all(
+        x.get("name") == y.get("name") and x.get("type") == y.get("type") and x.get("value") is y.get("value")
+        for x, y in zip(pa, pb)
+    )
+
+
+def _diff_row(old: Any, new: Any) -> Dict[str, Any]:
+    """等长的行给出逐个单元格的差异，长度不同时给出整行"""
+    if len(old) != len(new):
+        return {"old": old, "new": new}
+    return {"cells": [{"col": c, "old": x, "new": y} for c, (x, y) in enumerate(zip(old, new)) if x != y]}
+
+
+# 两段都超过这个乘积时不再用 SequenceMatcher（相同行很多时它是平方复杂度），按位置配对
+_MATCHER_LIMIT = 1 << 16
+
+
+def _unique_anchors(a: List[bytes], i1: int, i2: int, b: List[bytes], j1: int, j2: int) -> List[Tuple[int, int]]:
+    """两段中都只出现一次的行，取按两边顺序都递增的最长序列作为锚点（patience diff）"""
+    counts: Dict[bytes, List[int]] = {}
+    for i in range(i1, i2):
+        entry = counts.get(a[i])
+        if entry is None:
+            counts[a[i]] = [1, 0, i, 0]
+        else:
+            entry[0] += 1
+    for j in range(j1, j2):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = j
+    pairs = sorted((e[2], e[3]) for e in counts.values() if e[0] == 1 and e[1] == 1)
+    if not pairs:
+        return []
+    # 按 j 求最长递增子序列
+    tails: List[int] = []
+    tail_idx: List[int] = []
+    back: List[int] = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_right(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_idx.append(k)
+        else:
+            tails[pos] = j
+            tail_idx[pos] = k
+        back[k] = tail_idx[pos - 1] if pos else -1
+    anchors: List[Tuple[int, int]] = []
+    k = tail_idx[-1]
+    while k >= 0:
+        anchors.append(pairs[k])
+        k = back[k]
+    anchors.reverse()
+    return anchors
+
+
+def _row_runs(a: List[bytes], i1: int, i2: int) -> List[Tuple[bytes, int, int]]:
+    """连续相同的行合并为一段：[(行摘要, 起始行, 结束行)]"""
+    runs: List[Tuple[bytes, int, int]] = []
+    start = i1
+    for i in range(i1 + 1, i2 + 1):
+        if i == i2 or a[i] != a[start]:
+            runs.append((a[start], start, i))
+            start = i
+    return runs
+
+
+def _run_opcodes(a: List[bytes], i1: int, i2: int, b: List[bytes], j1: int, j2: int) -> Optional[List[Tuple[str, int, int, int, int]]]:
+    """
+    按段对齐（整块重复的矩阵没有唯一行可作锚点）：对两边的段序列用 SequenceMatcher，
+    对齐的两段长度不同时，多出的行记为段尾的插入/删除；段数仍太多时返回 None
+    """
+    runs_a = _row_runs(a, i1, i2)
+    runs_b = _row_runs(b, j1, j2)
+    if len(runs_a) * len(runs_b) > _MATCHER_LIMIT:
+        return None
+
+    def row(runs: List[Tuple[bytes, int, int]], k: int, end: int) -> int:
+        # 第 k 段的起始行（k 越过最后一段时为区间末尾）
+        return runs[k][1] if k < len(runs) else end
+
+    ops: List[Tuple[str, int, int, int, int]] = []
+    matcher = SequenceMatcher(None, [r[0] for r in runs_a], [r[0] for r in runs_b], autojunk=False)
+    for tag, k1, k2, l1, l2 in matcher.get_opcodes():
+        if tag != "equal":
+            ops.append((tag, row(runs_a, k1, i2), row(runs_a, k2, i2), row(runs_b, l1, j2), row(runs_b, l2, j2)))
+            continue
+        for (_, sa, ea), (_, sb, eb) in zip(runs_a[k1:k2], runs_b[l1:l2]):
+            common = min(ea - sa, eb - sb)
+            if ea - sa > common:
+                ops.append(("delete", sa + common, ea, eb, eb))
+            elif eb - sb > common:
+                ops.append(("insert", ea, ea, sb + common, eb))
+    return ops
+
+
+def _row_opcodes(a: List[bytes], b: List[bytes]) -> List[Tuple[str, int, int, int, int]]:
+    """
+    行对齐：去掉公共首尾行后以两边唯一的行为锚点分段，
+    没有锚点的小段用 SequenceMatcher，大段按连续相同行的段对齐，
+    段也太多时按位置配对（整体近线性）
+    """
+    ops: List[Tuple[str, int, int, int, int]] = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        i1, i2, j1, j2 = stack.pop()
+        while i1 < i2 and j1 < j2 and a[i1] == b[j1]:
+            i1 += 1
+            j1 += 1
+        while i1 < i2 and j1 < j2 and a[i2 - 1] == b[j2 - 1]:
+            i2 -= 1
+            j2 -= 1
+        if i1 == i2 and j1 == j2:
             continue
+        if i1 == i2 or j1 == j2:
+            ops.append(("insert" if i1 == i2 else "delete", i1, i2, j1, j2))
+            continue
+        anchors = _unique_anchors(a, i1, i2, b, j1, j2)
+        if anchors:
+            # 逆序压栈，保证输出按行号递增
+            segments = []
+            pi, pj = i1, j1
+            for ai, aj in anchors:
+                segments.append((pi, ai, pj, aj))
+                pi, pj = ai + 1, aj + 1
+            segments.append((pi, i2, pj, j2))
+            stack.extend(reversed(segments))
+        elif (i2 - i1) * (j2 - j1) <= _MATCHER_LIMIT:
+            matcher = SequenceMatcher(None, a[i1:i2], b[j1:j2], autojunk=False)
+            for tag, k1, k2, l1, l2 in matcher.get_opcodes():
+                if tag != "equal":
+                    ops.append((tag, k1 + i1, k2 + i1, l1 + j1, l2 + j1))
+        else:
+            run_ops = _run_opcodes(a, i1, i2, b, j1, j2)
+            ops.extend(run_ops if run_ops is not None else [("replace", i1, i2, j1, j2)])
+    return ops
+
+
+def _diff_matrix(old: List[Any], new: List[Any], old_rows: List[bytes], new_rows: List[bytes]) -> List[Dict[str, Any]]:
+    """
+    按行摘要比较矩阵：相同的首尾行直接跳过，中间部分按摘要对齐
+    （插入/删除行不会让后面的行都算作变化），替换的行逐个单元格比较
+    """
+    changes: List[Dict[str, Any]] = []
+    for tag, i1, i2, j1, j2 in _row_opcodes(old_rows, new_rows):
+        paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+        for k in range(paired):
+            if old_rows[i1 + k] != new_rows[j1 + k]:
+                changes.append({"op": "changed", "rowA": i1 + k, "rowB": j1 + k, **_diff_row(old[i1 + k], new[j1 + k])})
+        for i in range(i1 + paired, i2):
+            changes.append({"op": "removed", "rowA": i, "value": old[i]})
+        for j in range(j1 + paired, j2):
+            changes.append({"op": "added", "rowB": j, "value": new[j]})
+    return changes
 
-        if ":" in line:
-            colon = line.find(":")
-            key = line[:colon].strip()
-            val = line[colon + 1 :].strip()
 
-            if not key:
-                errors.append(ParseMsg(line_num, "参数名不能为空", "error"))
+def diff_text_bin(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    结构化比较两个模型（parse_text_bin 的结果或同结构，typed 与否均可）
+
+    模块按名称（同名模块按出现顺序）配对，参数按名称配对；模块和矩阵行先比较
+    摘要，未变化的模块、参数和矩阵行不再逐个元素比较。
+    只比较值，不比较注释、空行、参数顺序和数值写法以外的排版。
+
+    返回：
+        {
+          "identical": bool,
+          "summary": {"added": n, "removed": n, "changed": n},   # 按模块 + 参数计数
+          "changes": [
+            {"op": "added"|"removed", "module": 名称, "lineA": 行号|None, "lineB": 行号|None},
+            {"op": "added"|"removed"|"changed", "module": 名称, "param": 参数名,
+             "type": 类型, "lineA": 行号|None, "lineB": 行号|None, ...},
+          ]
+        }
+
+    参数变化的细节：
+        - 单值，或类型改变：old / new
+        - 数组：等长时 cells = [{"col", "old", "new"}]，否则 old / new
+        - 矩阵：rows = [{"op": "changed", "rowA", "rowB", cells 或 old/new},
+                        {"op": "removed", "rowA", "value"}, {"op": "added", "rowB", "value"}]
+          （rowA/rowB 为矩阵内的行下标，从 0 开始；lineA/lineB 为参数所在行）
+    """
+    def by_name(result: Dict[str, Any]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        seen: Dict[str, int] = {}
+        out: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for mod in result.get("modules") or []:
+            name = mod.get("name")
+            k = seen.get(name, 0)
+            seen[name] = k + 1
+            out[(name, k)] = mod
+        return out
+
+    mods_a = by_name(a)
+    mods_b = by_name(b)
+    changes: List[Dict[str, Any]] = []
+    summary = {"added": 0, "removed": 0, "changed": 0}
+
+    def add(entry: Dict[str, Any]) -> None:
+        summary[entry["op"]] += 1
+        changes.append(entry)
+
+    for key, mod_a in mods_a.items():
+        if key not in mods_b:
+            add({"op": "removed", "module": key[0], "lineA": mod_a.get("lineNum"), "lineB": None})
+
+    for key, mod_b in mods_b.items():
+        mod_a = mods_a.get(key)
+        if mod_a is None:
+            add({"op": "added", "module": key[0], "lineA": None, "lineB": mod_b.get("lineNum")})
+            continue
+        if _same_values(mod_a, mod_b):
+            continue
+        digest_a, params_a = _index_module(mod_a)
+        digest_b, params_b = _index_module(mod_b)
+        if digest_a == digest_b:
+            continue
+
+        module = key[0]
+        for name, (p, _, _) in params_a.items():
+            if name not in params_b:
+                add({"op": "removed", "module": module, "param": name, "type": p.get("type"),
+                     "lineA": p.get("lineNum"), "lineB": None, "old": p.get("value")})
+        for name, (pb, db, rows_b) in params_b.items():
+            if name not in params_a:
+                add({"op": "added", "module": module, "param": name, "type": pb.get("type"),
+                     "lineA": None, "lineB": pb.get("lineNum"), "new": pb.get("value")})
                 continue
-            if current_module is None:
-                errors.append(ParseMsg(line_num, f'参数 "{key}" 没有所属模块，请先定义模块名', "error"))
+            pa, da, rows_a = params_a[name]
+            if da == db:
                 continue
-
-            # duplicated param -> keep last, warn
-            exists = any(p.get("name") == key for p in current_module["params"])
-            if exists:
-                warnings.append(ParseMsg(line_num, f'模块 "{current_module["name"]}" 中参数 "{key}" 重复定义，将使用最后一个值', "warning"))
-                current_module["params"] = [p for p in current_module["params"] if p.get("name") != key]
-
-            if val == "":
-                pending_multiline = (key, line_num)
-                multiline_rows = []
-            elif " " in val:
-                arr = [_parse_value(v) for v in val.split()]
-                current_module["params"].append({"name": key, "value": arr, "type": "array", "lineNum": line_num})
+            entry = {"op": "changed", "module": module, "param": name, "type": pb.get("type"),
+                     "lineA": pa.get("lineNum"), "lineB": pb.get("lineNum")}
+            old, new = pa.get("value"), pb.get("value")
+            if pa.get("type") != pb.get("type"):
+                entry.update(old=old, new=new)
+            elif pb.get("type") == "matrix":
+                entry["rows"] = _diff_matrix(old or [], new or [], rows_a, rows_b)
+            elif pb.get("type") == "array":
+                entry.update(_diff_row(old or [], new or []))
             else:
-                current_module["params"].append({"name": key, "value": _parse_value(val), "type": "single", "lineNum": line_num})
-        else:
-            # module line
-            current_module = {"name": line, "params": [], "lineNum": line_num}
-            result["modules"].append(current_module)
+                entry.update(old=old, new=new)
+            add(entry)
 
-    # file end multiline
-    flush_multiline()
+    return {"identical": not changes, "summary": summary, "changes": changes}
 
-    if len(result["modules"]) == 0:
-        errors.append(ParseMsg(0, "文件中没有找到任何模块定义", "error"))
 
-    result["errors"] = [asdict(x) for x in errors]
-    result["warnings"] = [asdict(x) for x in warnings]
-    result["success"] = len(errors) == 0
-    return result
+class _ChunkWriter:
+    """
+    按块写出文本；始终扣住末尾的空白，close() 时丢弃并补一个换行，
+    效果等同于对整个输出做 rstrip() + "\\n"
+    """
+
+    def __init__(self, stream: TextIO, chunk_size: int, encoding: Optional[str] = None):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.parts: List[str] = []
+        self.size = 0
+        self.held = ""
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        text = self.held + "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        body = text.rstrip()
+        self.held = text[len(body):]
+        if body:
+            self._emit(body)
+
+    def close(self) -> None:
+        self.flush()
+        self._emit("\n")
 
+    def _emit(self, text: str) -> None:
+        self.stream.write(text.encode(self.encoding) if self.encoding else text)
 
-def build_text_bin(model: Dict[str, Any]) -> str:
+
+def _format_row(row: Any, float_fmt: Optional[str]) -> str:
+    """把一行数值格式化为空格分隔文本；float_fmt 只作用于浮点数"""
+    if float_fmt is None:
+        return " ".join(map(str, row))
+    if isinstance(row, array) and row.typecode == "d":
+        # 整行浮点：一次格式化
+        return (" ".join([float_fmt] * len(row))) % tuple(row)
+    return " ".join([float_fmt % x if type(x) is float else str(x) for x in row])
+
+
+def write_text_bin(
+    model: Dict[str, Any],
+    stream: Union[TextIO, BinaryIO],
+    float_precision: Optional[int] = None,
+    chunk_size: int = 1 << 16,
+    encoding: Optional[str] = None,
+) -> None:
     """
-    把 parse_text_bin 的结果（或同结构）序列化回文本 bin
+    把 parse_text_bin 的结果（或同结构）流式写成文本 bin
+
+    输出按块（约 chunk_size 个字符）写入 stream，峰值内存约为一个块。
+    默认输出与 build_text_bin 完全相同。
+
+    Args:
+        model: 模型结构
+        stream: 文本文件对象；传入 encoding 时为二进制文件对象
+                （如 socket.makefile("wb")），块编码后写入
+        float_precision: 指定时浮点数按固定小数位输出（"%.Nf"），整数不受影响
+        chunk_size: 每次写入的字符数
+        encoding: 二进制流的编码，如 "utf-8"
     """
-    modules = model.get("modules") or []
-    out: List[str] = []
-    for mod in modules:
+    float_fmt = None if float_precision is None else f"%.{int(float_precision)}f"
+    out = _ChunkWriter(stream, chunk_size, encoding)
+
+    for mod in model.get("modules") or []:
         name = mod.get("name", "")
         if not name:
             continue
-        out.append(str(name))
+        out.write(f"{name}\n")
         for p in mod.get("params") or []:
             p_name = p.get("name", "")
             p_type = p.get("type")
@@ -154,16 +1058,28 @@ def build_text_bin(model: Dict[str, Any]) -> str:
             if not p_name:
                 continue
             if p_type == "matrix":
-                out.append(f"{p_name}:")
+                out.write(f"{p_name}:\n")
                 for row in (p_val or []):
-                    if isinstance(row, list):
-                        out.append("    " + " ".join(str(x) for x in row))
+                    if isinstance(row, (list, array)):
+                        out.write("    " + _format_row(row, float_fmt) + "\n")
             elif p_type == "array":
-                arr = p_val if isinstance(p_val, list) else []
-                out.append(f"{p_name}:" + " ".join(str(x) for x in arr))
+                arr = p_val if isinstance(p_val, (list, array)) else []
+                out.write(f"{p_name}:" + _format_row(arr, float_fmt) + "\n")
+            elif float_fmt is not None and type(p_val) is float:
+                out.write(f"{p_name}:{float_fmt % p_val}\n")
             else:
-                out.append(f"{p_name}:{p_val}")
-        out.append("")
-    return "\n".join(out).rstrip() + "\n"
+                out.write(f"{p_name}:{p_val}\n")
+        out.write("\n")
+
+    out.close()
+
 
+def build_text_bin(model: Dict[str, Any], float_precision: Optional[int] = None) -> str:
+    """
+    把 parse_text_bin 的结果（或同结构）序列化回文本 bin
 
+    float_precision 同 write_text_bin；需要写文件/socket 时直接用 write_text_bin
+    """
+    buf = io.StringIO()
+    write_text_bin(model, buf, float_precision=float_precision)
+    return buf.getvalue()
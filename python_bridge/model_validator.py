@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型参数范围校验
+
+按 data/model_dictionary.json 中参数的 min/max/options 检查
+parse_text_bin 解析出的模块，超出范围的值作为 warning 返回
+（文件本身仍可解析，只是数值可疑）。
+
+字典只在构造 ModelValidator 时编译一次；数组和矩阵先用内置
+min()/max()/set 整行检查（C 层循环），只有整行不合格时才逐个定位。
+开启 cache_cells 时，数组/矩阵的检查结果按值对象缓存：增量解析复用的模块、
+解析缓存命中的结果与上次共享这些值对象，再次校验时不必重新扫描。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .bin_parser_text import ParseMsg
+
+
+DEFAULT_DICTIONARY_PATH = Path(__file__).resolve().parent.parent / "data" / "model_dictionary.json"
+
+_NUMERIC_TYPES = frozenset((int, float))
+
+# get_default_validator 的数组/矩阵检查结果缓存上限（按缓存值的单元格总数计）
+DEFAULT_CACHE_CELLS = 1 << 24
+
+
+def load_dictionary(path: Any = DEFAULT_DICTIONARY_PATH) -> Dict[str, Any]:
+    """读取模型字典 JSON"""
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+class _Rule:
+    """单个参数编译后的检查规则"""
+
+    __slots__ = ("lo", "hi", "options", "options_text", "range_text")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.lo = spec.get("min")
+        self.hi = spec.get("max")
+        options = spec.get("options")
+        self.options = frozenset(options) if options is not None else None
+        self.options_text = f"不在可选值 {options} 中"
+        self.range_text = f"超出范围 [{'' if self.lo is None else self.lo}, {'' if self.hi is None else self.hi}]"
+
+    def check(self, value: Any) -> str:
+        """检查单个值，返回问题描述（没有问题返回空串）"""
+        if self.options is not None:
+            try:
+                return "" if value in self.options else self.options_text
+            except TypeError:
+                return self.options_text
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return "不是数值"
+        if (self.lo is not None and value < self.lo) or (self.hi is not None and value > self.hi):
+            return self.range_text
+        return ""
+
+    def row_ok(self, row: Any) -> bool:
+        """整行快速检查：True 表示这一行全部合格"""
+        if self.options is not None:
+            try:
+                return self.options.issuperset(row)
+            except TypeError:
+                return False
+        if not isinstance(row, array) and not _NUMERIC_TYPES.issuperset(map(type, row)):
+            return False
+        if not len(row):
+            return True
+        return (self.lo is None or min(row) >= self.lo) and (self.hi is None or max(row) <= self.hi)
+
+
+class ModelValidator:
+    """
+    由模型字典编译出的参数校验器
+
+    用法：
+        validator = ModelValidator(load_dictionary())
+        result = validator.validate_result(parse_text_bin(content))
+
+    cache_cells > 0 时缓存数组/矩阵值的检查结果（键为值对象本身，缓存持有
+    值的引用，总单元格数不超过 cache_cells，LRU 淘汰）。被校验的结果之后
+    不能再修改，与 TextParseCache 的约定相同。
+    """
+
+    def __init__(self, dictionary: Dict[str, Any], cache_cells: int = 0):
+        self.rules: Dict[str, _Rule] = {}
+        for name, spec in (dictionary.get("parameters") or {}).items():
+            if spec.get("options") is not None or spec.get("min") is not None or spec.get("max") is not None:
+                self.rules[name] = _Rule(spec)
+        self.cache_cells = cache_cells
+        # id(值) -> (值, 规则, 参数类型, 问题列表, 单元格数)
+        self._cache: "OrderedDict[int, Tuple[Any, _Rule, str, List[Tuple[int, int, Any, str]], int]]" = OrderedDict()
+        self._cached_cells = 0
+        self._cache_lock = threading.Lock()
+
+    def validate_module(self, module: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        校验单个模块（parse_text_bin 的 modules 元素）
+
+        Returns:
+            (errors, warnings)，元素结构与 parse_text_bin 的消息相同
+        """
+        warnings: List[ParseMsg] = []
+
+        for p in module.get("params") or []:
+            rule = self.rules.get(p.get("name"))
+            if rule is None:
+                continue
+            value = p.get("value")
+            p_type = p.get("type")
+
+            if p_type == "matrix":
+                for r, c, v, problem in self._problems(rule, value, p_type):
+                    warnings.append(ParseMsg(p["lineNum"], f"{self._where(module, p)} 第 {r + 1} 行第 {c + 1} 列的值 {v} {problem}", "warning"))
+            elif p_type == "array":
+                for _, i, v, problem in self._problems(rule, value, p_type):
+                    warnings.append(ParseMsg(p["lineNum"], f"{self._where(module, p)} 第 {i + 1} 个值 {v} {problem}", "warning"))
+            else:
+                problem = rule.check(value)
+                if problem:
+                    warnings.append(ParseMsg(p["lineNum"], f"{self._where(module, p)} 的值 {value} {problem}", "warning"))
+
+        return [], [asdict(x) for x in warnings]
+
+    def validate_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        校验 parse_text_bin 的完整结果
+
+        返回新的结果字典（errors/warnings 为新列表），不修改传入的 result，
+        因此原结果仍可用于 reparse_text_bin。
+        """
+        errors = list(result.get("errors") or [])
+        warnings = list(result.get("warnings") or [])
+        for mod in result.get("modules") or []:
+            mod_errors, mod_warnings = self.validate_module(mod)
+            errors.extend(mod_errors)
+            warnings.extend(mod_warnings)
+        return {**result, "errors": errors, "warnings": warnings, "success": len(errors) == 0}
+
+    def _problems(self, rule: _Rule, value: Any, p_type: str) -> List[Tuple[int, int, Any, str]]:
+        """数组/矩阵中不合格的值 [(行, 列, 值, 问题)]（数组的行为 0），开启缓存时先查缓存"""
+        if not self.cache_cells or not value:
+            return _scan(rule, value, p_type)
+        key = id(value)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            # 缓存持有值的引用，id 不会被别的对象复用；仍核对对象本身以防万一
+            if entry is not None and entry[0] is value and entry[1] is rule and entry[2] == p_type:
+                self._cache.move_to_end(key)
+                return entry[3]
+
+        problems = _scan(rule, value, p_type)
+        cells = sum(map(len, value)) if p_type == "matrix" else len(value)
+        if cells <= self.cache_cells:
+            with self._cache_lock:
+                old = self._cache.pop(key, None)
+                if old is not None:
+                    self._cached_cells -= old[4]
+                self._cache[key] = (value, rule, p_type, problems, cells)
+                self._cached_cells += cells
+                while self._cached_cells > self.cache_cells:
+                    self._cached_cells -= self._cache.popitem(last=False)[1][4]
+        return problems
+
+    @staticmethod
+    def _where(module: Dict[str, Any], param: Dict[str, Any]) -> str:
+        return f'模块 "{module.get("name")}" 中参数 "{param.get("name")}"'
+
+
+def _scan(rule: _Rule, value: Any, p_type: str) -> List[Tuple[int, int, Any, str]]:
+    """逐行检查数组/矩阵，整行合格的跳过，只定位不合格行中的值"""
+    problems: List[Tuple[int, int, Any, str]] = []
+    rows = (value or []) if p_type == "matrix" else [value or ()]
+    for r, row in enumerate(rows):
+        if rule.row_ok(row):
+            continue
+        for c, v in enumerate(row):
+            problem = rule.check(v)
+            if problem:
+                problems.append((r, c, v, problem))
+    return problems
+
+
+_default_lock = threading.Lock()
+_default_validator: Optional[ModelValidator] = None
+_default_stamp: Optional[Tuple[int, int]] = None
+
+
+def get_default_validator() -> ModelValidator:
+    """
+    按 data/model_dictionary.json 编译的校验器（开启检查结果缓存）；
+    文件变化（mtime/大小）时重新编译，缓存随旧校验器一起丢弃
+    """
+    global _default_validator, _default_stamp
+    st = os.stat(DEFAULT_DICTIONARY_PATH)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _default_lock:
+        if _default_validator is None or _default_stamp != stamp:
+            _default_validator = ModelValidator(load_dictionary(), cache_cells=DEFAULT_CACHE_CELLS)
+            _default_stamp = stamp
+        return _default_validator
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+diff_text_bin 回归测试：矩阵行对齐（唯一行锚点、大段无锚点时的回退）、
+单元格变化、模块增删，以及 typed 与否的解析结果比较
+
+运行: python -m unittest discover tests
+"""
+
+import unittest
+
+from python_bridge.bin_parser_text import diff_text_bin, parse_text_bin
+
+
+def _matrix_text(rows, extra: str = "") -> str:
+    body = "".join("    " + " ".join(str(v) for v in row) + "\n" for row in rows)
+    return "Mod\nm:\n" + body + extra
+
+
+def _row_ops(a: str, b: str):
+    result = diff_text_bin(parse_text_bin(a, "a.bin"), parse_text_bin(b, "b.bin"))
+    changed = [c for c in result["changes"] if c.get("param") == "m"]
+    if not changed:
+        return []
+    return [(r["op"], r.get("rowA"), r.get("rowB")) for r in changed[0]["rows"]]
+
+
+class DiffTextBinTest(unittest.TestCase):
+
+    def test_identical(self):
+        text = _matrix_text([[i, i + 1] for i in range(10)], "x:1\n")
+        result = diff_text_bin(parse_text_bin(text, "a.bin"), parse_text_bin(text, "b.bin"))
+        self.assertTrue(result["identical"])
+        self.assertEqual(result["summary"], {"added": 0, "removed": 0, "changed": 0})
+
+    def test_inserted_row(self):
+        rows = [[i, i * 2, i * 3] for i in range(100)]
+        new = rows[:40] + [[-1, -2, -3]] + rows[40:]
+        self.assertEqual(_row_ops(_matrix_text(rows), _matrix_text(new)), [("added", None, 40)])
+
+    def test_removed_row(self):
+        rows = [[i, i * 2] for i in range(100)]
+        new = rows[:10] + rows[11:]
+        self.assertEqual(_row_ops(_matrix_text(rows), _matrix_text(new)), [("removed", 10, None)])
+
+    def test_changed_cell(self):
+        rows = [[i, i * 2, i * 3] for i in range(50)]
+        new = [list(r) for r in rows]
+        new[7][1] = 999
+        result = diff_text_bin(parse_text_bin(_matrix_text(rows), "a.bin"), parse_text_bin(_matrix_text(new), "b.bin"))
+        self.assertEqual(result["summary"], {"added": 0, "removed": 0, "changed": 1})
+        (change,) = result["changes"]
+        self.assertEqual(change["rows"], [{"op": "changed", "rowA": 7, "rowB": 7, "cells": [{"col": 1, "old": 14, "new": 999}]}])
+
+    def test_changed_single_and_array(self):
+        a = "Mod\nx:1\ny:1 2 3\n"
+        b = "Mod\nx:2\ny:1 5 3\n"
+        result = diff_text_bin(parse_text_bin(a, "a.bin"), parse_text_bin(b, "b.bin"))
+        by_param = {c["param"]: c for c in result["changes"]}
+        self.assertEqual((by_param["x"]["old"], by_param["x"]["new"]), (1, 2))
+        self.assertEqual(by_param["y"]["cells"], [{"col": 1, "old": 2, "new": 5}])
+
+    def test_added_and_removed_module(self):
+        a = "A\nx:1\nB\ny:2\n"
+        b = "A\nx:1\nC\nz:3\n"
+        result = diff_text_bin(parse_text_bin(a, "a.bin"), parse_text_bin(b, "b.bin"))
+        self.assertEqual(result["summary"], {"added": 1, "removed": 1, "changed": 0})
+        ops = {(c["op"], c["module"], c["lineA"], c["lineB"]) for c in result["changes"]}
+        self.assertEqual(ops, {("removed", "B", 3, None), ("added", "C", None, 3)})
+
+    def test_typed_and_untyped_are_identical(self):
+        text = _matrix_text([[i * 0.5, i] for i in range(20)], "a:1 2 3\nb:1.5 2.5\nc:x y\nd:7\n")
+        plain = parse_text_bin(text, "a.bin")
+        typed = parse_text_bin(text, "a.bin", typed=True)
+        self.assertTrue(diff_text_bin(plain, typed)["identical"])
+        self.assertTrue(diff_text_bin(typed, plain)["identical"])
+
+        changed = parse_text_bin(text.replace("d:7", "d:8"), "b.bin", typed=True)
+        result = diff_text_bin(plain, changed)
+        self.assertEqual([(c["param"], c["old"], c["new"]) for c in result["changes"]], [("d", 7, 8)])
+
+    def test_anchors_split_large_regions(self):
+        # 两处插入之间全是唯一行：以它们为锚点分段，不会把中间的行算作变化
+        rows = [[i, i + 1] for i in range(3000)]
+        new = [[-1, -1]] + rows[:1500] + [[-2, -2]] + rows[1500:] + [[-3, -3]]
+        self.assertEqual(_row_ops(_matrix_text(rows), _matrix_text(new)),
+                         [("added", None, 0), ("added", None, 1501), ("added", None, 3002)])
+
+    def test_repeated_rows_insert_at_both_ends(self):
+        # 没有唯一行可作锚点、也大到不能用 SequenceMatcher：按连续相同行的段对齐
+        rows = [[1, 2, 3]] * 50000
+        new = [[0, 0, 0]] + rows + [[9, 9, 9]]
+        self.assertEqual(_row_ops(_matrix_text(rows), _matrix_text(new)),
+                         [("added", None, 0), ("added", None, 50001)])
+
+    def test_repeated_rows_with_run_length_change(self):
+        rows = [[1, 1]] * 3000 + [[2, 2]] * 3000
+        new = [[0, 0]] + [[1, 1]] * 2999 + [[2, 2]] * 3001
+        ops = _row_ops(_matrix_text(rows), _matrix_text(new))
+        # 段长度不同：多出/缺少的行记在段尾
+        self.assertEqual(ops, [("added", None, 0), ("removed", 2999, None), ("added", None, 3000)])
+        self.assertEqual(_apply(rows, new, ops), new)
+
+    def test_fallback_ops_apply_cleanly(self):
+        # 交替重复的行（没有唯一行、段也很多）：无论怎样对齐，结果都要能把旧矩阵改成新矩阵
+        rows = [[i % 3, 0] for i in range(900)]
+        for new in (rows[5:] + [[7, 7]], [[7, 7]] + rows[:-5], rows[:300] + [[8, 8]] * 4 + rows[300:]):
+            ops = _row_ops(_matrix_text(rows), _matrix_text(new))
+            self.assertEqual(_apply(rows, new, ops), new)
+
+
+def _apply(old, new, ops):
+    """按 rows 变化把 old 改成 new（只用 op 和行号，验证对齐结果自洽）"""
+    removed = {a for op, a, _ in ops if op in ("removed", "changed")}
+    added = {b for op, _, b in ops if op in ("added", "changed")}
+    kept = [row for i, row in enumerate(old) if i not in removed]
+    out, k = [], 0
+    for j in range(len(new)):
+        if j in added:
+            out.append(new[j])
+        else:
+            out.append(kept[k])
+            k += 1
+    return out if k == len(kept) else None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+patch_bin_file / patch_bin_data / LazyBinFile.patch 回归测试：每次修改后
+校验和有效，完整解析的参数值与逐次累积的期望值相同，未修改的条目原样保留
+
+运行: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from python_bridge.bin_parser import (
+    BinParser, LazyBinFile, parse_bin_file, patch_bin_data, patch_bin_file, verify_bin_file,
+)
+
+
+def _params() -> dict:
+    return {
+        "header": {"version": 2, "timestamp": 1700000000},
+        "params": {
+            "gain": {"id": 1, "type": "FLOAT32", "value": 1.5},
+            "mode": {"id": 2, "type": "UINT8", "value": 3},
+            "label": {"id": 3, "type": "STRING", "value": "abc"},
+            "curve": {"id": 4, "type": "ARRAY", "elem_type": "INT16", "value": [1, -2, 3]},
+            "offset": {"id": 5, "type": "INT32", "value": -7},
+            "scale": {"id": 6, "type": "FLOAT64", "value": 0.25},
+        },
+    }
+
+
+def _values(result: dict) -> dict:
+    return {name: p["value"] for name, p in result["params"].items()}
+
+
+class PatchBinFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "m.bin")
+        with open(self.path, "wb") as f:
+            f.write(BinParser().build(_params()))
+        self.expected = _values(BinParser().parse(self._read()))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def _check(self, updates: dict):
+        # 文件与期望值（逐次累积的修改）一致，且校验和有效
+        self.expected.update(updates)
+        self.assertTrue(verify_bin_file(self.path))
+        result = parse_bin_file(self.path)
+        self.assertEqual(_values(result), self.expected)
+        self.assertEqual(result["header"]["version"], 2)
+        self.assertEqual(result["header"]["timestamp"], 1700000000)
+
+    def test_fixed_width(self):
+        size = os.path.getsize(self.path)
+        patch_bin_file(self.path, {"mode": 9, "offset": 123456})
+        self.assertEqual(os.path.getsize(self.path), size)
+        self._check({"mode": 9, "offset": 123456})
+
+    def test_length_change_before_later_entries(self):
+        # label、curve 之后还有 offset、scale，尾部重写后要原样保留
+        patch_bin_file(self.path, {"label": "a much longer label", "offset": 5})
+        self._check({"label": "a much longer label", "offset": 5})
+        patch_bin_file(self.path, {"curve": [7], "scale": -1.0})
+        self._check({"curve": [7], "scale": -1.0})
+        patch_bin_file(self.path, {"label": "", "curve": [1, 2, 3, 4, 5, 6]})
+        self._check({"label": "", "curve": [1, 2, 3, 4, 5, 6]})
+
+    def test_repeated_patch_on_one_handle(self):
+        steps = [
+            {"gain": 2.5},
+            {"label": "longer than before"},
+            {"mode": 1, "curve": []},
+            {"label": "x", "curve": [9, 8]},
+            {"scale": 3.0},
+        ]
+        with LazyBinFile.open(self.path, writable=True) as lazy:
+            for updates in steps:
+                lazy.patch(updates)
+                self._check(updates)
+                for name, value in updates.items():
+                    self.assertEqual(lazy.get(name).value, value)
+        self._check({})
+
+    def test_patch_bin_data_matches_file(self):
+        updates = {"label": "changed", "curve": [4, 5], "mode": 0}
+        data = bytearray(self._read())
+        patch_bin_data(data, updates)
+        patch_bin_file(self.path, updates)
+        self.assertEqual(bytes(data), self._read())
+        self._check(updates)
+
+    def test_unknown_name_leaves_file_unchanged(self):
+        before = self._read()
+        with self.assertRaises(KeyError):
+            patch_bin_file(self.path, {"gain": 9.0, "missing": 1})
+        self.assertEqual(self._read(), before)
+
+        with LazyBinFile.open(self.path, writable=True) as lazy:
+            with self.assertRaises(KeyError):
+                lazy.patch({"label": "longer value here", "missing": 1})
+            # 失败后句柄仍可继续使用
+            lazy.patch({"mode": 4})
+        self._check({"mode": 4})
+
+
+if __name__ == "__main__":
+    unittest.main()
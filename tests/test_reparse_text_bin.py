@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+reparse_text_bin 回归测试：随机编辑后增量解析的结果必须与完整解析相同，
+edits 提示有误（行号偏移、行数不对）时也一样
+
+运行: python -m unittest discover tests
+"""
+
+import copy
+import random
+import unittest
+
+from python_bridge.bin_parser_text import parse_text_bin, reparse_text_bin
+
+
+def _rand_line(rng: random.Random) -> str:
+    r = rng.random()
+    if r < 0.15:
+        return rng.choice(["A", "B", "C", "  D"])
+    if r < 0.3:
+        return rng.choice("abc") + ":"
+    if r < 0.45:
+        return rng.choice(["    1 2 3", "\t4.5 x", "    "])
+    if r < 0.5:
+        return rng.choice(["", "# c", "END", ":x"])
+    return rng.choice("abcd") + ":" + rng.choice(["1", "1 2", "x"])
+
+
+class ReparseTextBinTest(unittest.TestCase):
+
+    def _check(self, old: str, new: str, edits=None):
+        prev = parse_text_bin(old, "f.bin")
+        snapshot = copy.deepcopy(prev)
+        result = reparse_text_bin(prev, new, edits=edits)
+        self.assertEqual(result, parse_text_bin(new, "f.bin"), (old, new, edits))
+        self.assertEqual(prev, snapshot)
+
+    def test_off_by_one_hint(self):
+        old = "A\na:1\nb:2\nc:3\nB\nd:4\n"
+        new = "A\na:1\nb:2\nc:3\nb2:5\nB\nd:4\n"
+        # 实际在第 4 行之后插入一行（应为 [(5, 0, 1)]）
+        self._check(old, new, edits=[(6, 0, 1)])
+        self._check(old, new, edits=[(5, 0, 1)])
+        self._check(old, new, edits=[(5, 0, 2)])
+        self._check(old, new, edits=[])
+
+    def test_random_edits(self):
+        rng = random.Random(7)
+        for _ in range(3000):
+            lines = [_rand_line(rng) for _ in range(rng.randint(0, 25))]
+            new = list(lines)
+            start = rng.randint(0, len(new))
+            removed = rng.randint(0, min(3, len(new) - start))
+            inserted = [_rand_line(rng) for _ in range(rng.randint(0, 3))]
+            new[start:start + removed] = inserted
+            old_text, new_text = "\n".join(lines), "\n".join(new)
+
+            self._check(old_text, new_text)
+            self._check(old_text, new_text, edits=[(start + 1, removed, len(inserted))])
+            # 错误的提示：起始行或行数随机偏移
+            bad = (start + 1 + rng.randint(-2, 2), max(removed + rng.randint(-1, 1), 0), len(inserted) + rng.randint(-1, 1))
+            self._check(old_text, new_text, edits=[bad])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+fastapi_server 分块 JSON 序列化（_dumps_json / _json_pieces）回归测试：
+拼接结果必须与 json.dumps(..., ensure_ascii=False, default=json_default) 逐字节相同。
+分块阈值（TEXT_CHUNK、JSON_BATCH、JSON_FLAT_MAX、JSON_SMALL_KEYS）临时调小，
+让小数据也走到各个分支。
+
+运行: python -m unittest discover tests（需要安装 fastapi_server/requirements.txt）
+"""
+
+import json
+import random
+import sys
+import unittest
+from array import array
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "fastapi_server"))
+try:
+    import main
+except ImportError as e:  # 未安装 fastapi
+    raise unittest.SkipTest(f"无法导入 fastapi_server/main.py: {e}")
+
+
+SMALL_LIMITS = {"TEXT_CHUNK": 8, "JSON_BATCH": 3, "JSON_FLAT_MAX": 4, "JSON_SMALL_KEYS": 2}
+
+
+def _scalar(rng: random.Random):
+    return rng.choice([
+        0, -7, 2 ** 70, 1.5, -0.0, 1e-300, True, False, None,
+        "", "x", "中文", 'q"uote\\', "\n\t\x00", "长" * rng.randint(5, 30), "a" * rng.randint(5, 40),
+    ])
+
+
+def _array(rng: random.Random):
+    n = rng.randint(0, 12)
+    return rng.choice([
+        array("q", [rng.randint(-10 ** 12, 10 ** 12) for _ in range(n)]),
+        array("d", [rng.uniform(-1e6, 1e6) for _ in range(n)]),
+        array("d", [float("nan"), float("inf"), 1.0][: n % 4]),
+        array("i", [rng.randint(-100, 100) for _ in range(n)]),
+    ])
+
+
+def _value(rng: random.Random, depth: int = 0):
+    r = rng.random()
+    if depth > 3 or r < 0.35:
+        return _scalar(rng)
+    if r < 0.45:
+        return _array(rng)
+    if r < 0.65:
+        return [_value(rng, depth + 1) for _ in range(rng.randint(0, 9))]
+    if r < 0.72:
+        return tuple(_value(rng, depth + 1) for _ in range(rng.randint(0, 5)))
+    if r < 0.78:
+        # 非字符串键：json.dumps 会转成字符串
+        return {rng.choice([1, 2.5, True, None, "k"]): _value(rng, depth + 1) for _ in range(rng.randint(1, 3))}
+    return {f"k{i}": _value(rng, depth + 1) for i in range(rng.randint(0, 6))}
+
+
+def _reference(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=main.json_default)
+
+
+class WsJsonTest(unittest.TestCase):
+
+    def _check(self, obj):
+        with mock.patch.multiple(main, **SMALL_LIMITS):
+            self.assertEqual(main._dumps_json(obj), _reference(obj))
+        self.assertEqual(main._dumps_json(obj), _reference(obj))
+
+    def test_random_values(self):
+        rng = random.Random(23)
+        for _ in range(2000):
+            self._check(_value(rng))
+
+    def test_shapes(self):
+        rows = [[i, i + 0.5, "s"] for i in range(20)]
+        typed_rows = [array("d", [i * 0.25] * 7) for i in range(20)]
+        self._check({
+            "modules": [{"name": "M", "params": [
+                {"name": "m", "type": "matrix", "value": rows, "lineNum": 3},
+                {"name": "t", "type": "matrix", "value": typed_rows, "lineNum": 30},
+                {"name": "a", "type": "array", "value": array("q", range(50)), "lineNum": 60},
+            ]}],
+            "raw": "长文本\n" * 50,
+            "nested": [[[1, [2, (3, {"x": ()})]]], {}, [], ()],
+        })
+        self._check([{"name": f"p{i}", "value": i, "lineNum": i} for i in range(100)])
+        self._check({1: "a", "b": [1, 2]})
+        self._check("x" * 100)
+
+    def test_text_slot(self):
+        payload = {"cmd_id": 1, "data": {"success": True, "content": main._TEXT_SLOT, "filename": "a.bin"}}
+        text = ["第一块\"", "\\second\n", ""]
+        expected = _reference({**payload, "data": {**payload["data"], "content": "".join(text)}})
+        with mock.patch.multiple(main, **SMALL_LIMITS):
+            self.assertEqual(main._dumps_json(payload, text), expected)
+        raw = json.dumps({"ok": [1, 2]})
+        self.assertEqual(main._dumps_json({"cmd_id": 1, "data": main._TEXT_SLOT}, raw=raw),
+                         _reference({"cmd_id": 1, "data": {"ok": [1, 2]}}))
+
+    def test_typed_arrays_skip_json_default(self):
+        obj = {"rows": [array("d", [0.1, 2.0, -3e-9])] * 5, "ids": array("q", [1, -2, 3])}
+        with mock.patch.object(main, "json_default", side_effect=AssertionError("array 被转成了 list")):
+            with mock.patch.multiple(main, **SMALL_LIMITS):
+                out = main._dumps_json(obj)
+        self.assertEqual(out, _reference(obj))
+
+
+if __name__ == "__main__":
+    unittest.main()